@@ -0,0 +1,72 @@
+"""attendance weekly rollup
+
+Revision ID: 20261017_01
+Revises: 678f8d9bdbd5
+Create Date: 2026-10-17 10:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20261017_01"
+down_revision: Union[str, Sequence[str], None] = "678f8d9bdbd5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attendance_weekly",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("class_id", sa.Integer(), nullable=False),
+        sa.Column("week_start", sa.Date(), nullable=False),
+        sa.Column("days_filled", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_students", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("present_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("absent_excused", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("absent_unexcused", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["class_id"], ["classes.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("class_id", "week_start", name="uq_attendance_weekly"),
+    )
+    op.create_index("ix_attendance_weekly_week_start", "attendance_weekly", ["week_start"], unique=False)
+    op.execute(
+        """
+        INSERT INTO attendance_weekly (
+            class_id, week_start, days_filled, total_students, present_count,
+            absent_excused, absent_unexcused, updated_at
+        )
+        SELECT
+            fills.class_id,
+            fills.week_start,
+            fills.days_filled,
+            fills.total_students,
+            fills.present_count,
+            COALESCE(absences.excused, 0),
+            COALESCE(absences.unexcused, 0),
+            LOCALTIMESTAMP
+        FROM (
+            SELECT class_id, date_trunc('week', date)::date AS week_start, count(*) AS days_filled,
+                   sum(total_students) AS total_students, sum(present_count) AS present_count
+            FROM attendance_fill
+            GROUP BY class_id, date_trunc('week', date)::date
+        ) AS fills
+        LEFT JOIN (
+            SELECT class_id, date_trunc('week', date)::date AS week_start,
+                   count(*) FILTER (WHERE status = 'excused') AS excused,
+                   count(*) FILTER (WHERE status = 'unexcused') AS unexcused
+            FROM attendance
+            GROUP BY class_id, date_trunc('week', date)::date
+        ) AS absences
+            ON absences.class_id = fills.class_id AND absences.week_start = fills.week_start
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_attendance_weekly_week_start", table_name="attendance_weekly")
+    op.drop_table("attendance_weekly")
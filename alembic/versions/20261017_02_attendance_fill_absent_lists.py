@@ -0,0 +1,58 @@
+"""attendance_fill absent lists
+
+Revision ID: 20261017_02
+Revises: 20261017_01
+Create Date: 2026-10-17 12:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20261017_02"
+down_revision: Union[str, Sequence[str], None] = "20261017_01"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "attendance_fill",
+        sa.Column("absent_unexcused", postgresql.JSONB(), nullable=False, server_default="[]"),
+    )
+    op.add_column(
+        "attendance_fill",
+        sa.Column("absent_excused", postgresql.JSONB(), nullable=False, server_default="[]"),
+    )
+    op.execute(
+        """
+        UPDATE attendance_fill
+        SET absent_unexcused = lists.unexcused, absent_excused = lists.excused
+        FROM (
+            SELECT
+                date,
+                class_id,
+                COALESCE(
+                    jsonb_agg(jsonb_build_object('fullName', absent_name) ORDER BY id)
+                        FILTER (WHERE status = 'unexcused'),
+                    '[]'::jsonb
+                ) AS unexcused,
+                COALESCE(
+                    jsonb_agg(jsonb_build_object('fullName', absent_name, 'reason', COALESCE(reason, '')) ORDER BY id)
+                        FILTER (WHERE status = 'excused'),
+                    '[]'::jsonb
+                ) AS excused
+            FROM attendance
+            GROUP BY date, class_id
+        ) AS lists
+        WHERE attendance_fill.date = lists.date AND attendance_fill.class_id = lists.class_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("attendance_fill", "absent_excused")
+    op.drop_column("attendance_fill", "absent_unexcused")
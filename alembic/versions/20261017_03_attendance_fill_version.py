@@ -0,0 +1,28 @@
+"""attendance_fill version counter
+
+Revision ID: 20261017_03
+Revises: 20261017_02
+Create Date: 2026-10-17 14:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20261017_03"
+down_revision: Union[str, Sequence[str], None] = "20261017_02"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "attendance_fill",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("attendance_fill", "version")
@@ -0,0 +1,55 @@
+"""date-leading covering indexes for attendance reads
+
+Revision ID: 20261017_04
+Revises: 20261017_03
+Create Date: 2026-10-17 16:00:00
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "20261017_04"
+down_revision: Union[str, Sequence[str], None] = "20261017_03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps saves running while the indexes build; it cannot run in a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_attendance_date_class_covering",
+            "attendance",
+            ["date", "class_id", "id"],
+            unique=False,
+            postgresql_include=["absent_name", "status", "reason"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_attendance_fill_date_class_covering",
+            "attendance_fill",
+            ["date", "class_id"],
+            unique=False,
+            postgresql_include=["version"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_attendance_fill_date_class_covering",
+            table_name="attendance_fill",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_attendance_date_class_covering",
+            table_name="attendance",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
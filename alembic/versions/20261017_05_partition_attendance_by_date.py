@@ -0,0 +1,87 @@
+"""partition attendance and attendance_fill by date
+
+Revision ID: 20261017_05
+Revises: 20261017_04
+Create Date: 2026-10-17 18:00:00
+
+Both tables are rebuilt as range-partitioned tables with one partition per
+day, plus a default partition, and their rows are copied over. The copy runs
+in the migration transaction and locks the tables until it commits, so run it
+in a quiet moment; with the usual retention window it is a few days of rows.
+"""
+
+from datetime import date, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20261017_05"
+down_revision: Union[str, Sequence[str], None] = "20261017_04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The running app creates partitions this far ahead (PARTITION_PREMAKE_DAYS); the migration
+# covers the same window so saves right after it land in daily partitions.
+PREMAKE_DAYS = 14
+TABLES = {
+    "attendance": {
+        "unique": ("uq_attendance", ["date", "class_id", "absent_name", "status"]),
+        "indexes": [
+            ("ix_attendance_class_date", ["class_id", "date"], []),
+            ("ix_attendance_date_class_covering", ["date", "class_id", "id"], ["absent_name", "status", "reason"]),
+        ],
+    },
+    "attendance_fill": {
+        "unique": ("uq_attendance_fill", ["date", "class_id"]),
+        "indexes": [
+            ("ix_attendance_fill_class_date", ["class_id", "date"], []),
+            ("ix_attendance_fill_date_class_covering", ["date", "class_id"], ["version"]),
+        ],
+    },
+}
+
+
+def _rebuild(table: str, partitioned: bool) -> None:
+    # The new table copies columns, types and the id sequence default from the old one.
+    old = f"{table}_old"
+    spec = TABLES[table]
+    op.rename_table(table, old)
+    op.execute(f"ALTER INDEX {table}_pkey RENAME TO {old}_pkey")
+    op.drop_constraint(spec["unique"][0], old, type_="unique")
+    for name, _, _ in spec["indexes"]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_class_id_fkey TO {old}_class_id_fkey")
+
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)" + (" PARTITION BY RANGE (date)" if partitioned else "")
+    )
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.create_primary_key(f"{table}_pkey", table, ["id", "date"] if partitioned else ["id"])
+    op.create_unique_constraint(spec["unique"][0], table, spec["unique"][1])
+    op.create_foreign_key(f"{table}_class_id_fkey", table, "classes", ["class_id"], ["id"])
+    for name, columns, include in spec["indexes"]:
+        op.create_index(name, table, columns, unique=False, postgresql_include=include)
+
+    if partitioned:
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        days = set(op.get_bind().execute(sa.text(f"SELECT DISTINCT date FROM {old}")).scalars())
+        days.update(date.today() + timedelta(days=offset) for offset in range(PREMAKE_DAYS + 1))
+        for day in sorted(days):
+            op.execute(
+                f"CREATE TABLE {table}_p{day:%Y%m%d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            )
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.drop_table(old)
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        _rebuild(table, partitioned=True)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        _rebuild(table, partitioned=False)
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import ClassBase, UserBase
+from notifications import listener, notify
+
+CLASS_DIRECTORY_CHANNEL = "class_directory"
+CLASS_DIRECTORY_TTL_SECONDS = int(os.getenv("CLASS_DIRECTORY_TTL_SECONDS", "300"))
+_CHANGED_KEY = "class_directory_changed"
+_HOST_TOKEN = uuid.uuid4().hex
+
+
+@dataclass(frozen=True)
+class ClassEntry:
+    id: int
+    name: str
+    teacher_id: int
+    teacher_login: str | None
+
+
+@dataclass(frozen=True)
+class DirectorySnapshot:
+    classes: tuple[ClassEntry, ...]
+    version: str = ""
+    by_id: dict[int, ClassEntry] = field(default_factory=dict)
+    by_teacher: dict[int, tuple[ClassEntry, ...]] = field(default_factory=dict)
+
+    def for_teacher(self, teacher_id: int) -> tuple[ClassEntry, ...]:
+        return self.by_teacher.get(teacher_id, ())
+
+
+class ClassDirectory:
+    def __init__(self):
+        self._snapshot: DirectorySnapshot | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+
+    def _fresh(self) -> DirectorySnapshot | None:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < CLASS_DIRECTORY_TTL_SECONDS:
+            return snapshot
+        return None
+
+    async def snapshot(self, s: AsyncSession) -> DirectorySnapshot:
+        snapshot = self._fresh()
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            snapshot = self._fresh()
+            if snapshot is not None:
+                return snapshot
+            generation = self._generation
+            rows = (
+                await s.execute(
+                    select(ClassBase.id, ClassBase.name, ClassBase.teacher_id, UserBase.login)
+                    .outerjoin(UserBase, UserBase.id == ClassBase.teacher_id)
+                    .order_by(ClassBase.id.asc())
+                )
+            ).all()
+            classes = tuple(ClassEntry(*row) for row in rows)
+            by_teacher: dict[int, list[ClassEntry]] = {}
+            for entry in classes:
+                by_teacher.setdefault(entry.teacher_id, []).append(entry)
+            snapshot = DirectorySnapshot(
+                classes=classes,
+                # Content hash, so every worker derives the same version from the same data.
+                version=hashlib.sha1(repr(classes).encode("utf-8")).hexdigest()[:16],
+                by_id={entry.id: entry for entry in classes},
+                by_teacher={teacher_id: tuple(entries) for teacher_id, entries in by_teacher.items()},
+            )
+            # A write committed while we were loading makes this snapshot stale; serve it once, don't keep it.
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+            return snapshot
+
+
+directory = ClassDirectory()
+
+
+def _origin() -> str:
+    # Sent as the NOTIFY payload: this process already invalidated on commit and skips its own
+    # notifications. The pid tells apart workers forked after this module was imported.
+    return f"{_HOST_TOKEN}:{os.getpid()}"
+
+
+async def mark_changed(s: AsyncSession) -> None:
+    await notify(s, CLASS_DIRECTORY_CHANNEL, _origin())
+    s.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        directory.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def _on_directory_changed(payload: str | None) -> None:
+    # None means the listener reconnected and may have missed notifications from any process.
+    if payload != _origin():
+        directory.invalidate()
+
+
+listener.subscribe(CLASS_DIRECTORY_CHANNEL, _on_directory_changed)
@@ -0,0 +1,100 @@
+import csv
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from io import StringIO
+
+from sqlalchemy import delete, select, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import ClassBase, RoleEnum, UserBase
+
+CLASS_IMPORT_MAX_ROWS = int(os.getenv("CLASS_IMPORT_MAX_ROWS", "1000"))
+HEADER = ["name", "password"]
+
+
+@dataclass(frozen=True)
+class ClassImportRow:
+    line: int
+    name: str
+    password: str
+    error: str | None = None
+
+
+def parse_class_csv(data: bytes) -> list[ClassImportRow]:
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("CSV must be UTF-8 encoded")
+    first_line = text.partition("\n")[0]
+    # Excel with a Russian locale saves CSV with semicolons.
+    delimiter = ";" if ";" in first_line and "," not in first_line else ","
+    reader = csv.reader(StringIO(text), delimiter=delimiter)
+    rows = []
+    for record in reader:
+        if not any(value.strip() for value in record):
+            continue
+        if not rows and [value.strip().lower() for value in record] == HEADER:
+            continue
+        if len(rows) >= CLASS_IMPORT_MAX_ROWS:
+            raise ValueError(f"CSV must have at most {CLASS_IMPORT_MAX_ROWS} rows")
+        if len(record) != 2:
+            rows.append(ClassImportRow(reader.line_num, record[0].strip(), "", "Expected two columns: name,password"))
+            continue
+        name, password = record[0].strip(), record[1]
+        error = None
+        if not name:
+            error = "Class name is required"
+        elif not password:
+            error = "Password is required"
+        rows.append(ClassImportRow(reader.line_num, name, password, error))
+    return rows
+
+
+async def taken_names(s: AsyncSession, names: list[str]) -> set[str]:
+    # A class and its teacher account share the name, so either table can hold it.
+    if not names:
+        return set()
+    stmt = union(
+        select(UserBase.login).where(UserBase.login.in_(names)),
+        select(ClassBase.name).where(ClassBase.name.in_(names)),
+    )
+    return set((await s.scalars(stmt)).all())
+
+
+async def insert_classes(s: AsyncSession, accounts: list[tuple[str, str]]) -> set[str]:
+    # Two multi-row inserts; rows that lost a race with another writer are skipped by
+    # ON CONFLICT and left out of the returned names.
+    if not accounts:
+        return set()
+    now = datetime.now()
+    user_rows = (
+        await s.execute(
+            pg_insert(UserBase)
+            .values(
+                [
+                    {"login": name, "password": hashed, "role": RoleEnum.teacher, "created_at": now, "updated_at": now}
+                    for name, hashed in accounts
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[UserBase.login])
+            .returning(UserBase.id, UserBase.login)
+        )
+    ).all()
+    if not user_rows:
+        return set()
+    created = set(
+        (
+            await s.scalars(
+                pg_insert(ClassBase)
+                .values([{"name": login, "teacher_id": user_id, "created_at": now} for user_id, login in user_rows])
+                .on_conflict_do_nothing(index_elements=[ClassBase.name])
+                .returning(ClassBase.name)
+            )
+        ).all()
+    )
+    orphaned = [user_id for user_id, login in user_rows if login not in created]
+    if orphaned:
+        await s.execute(delete(UserBase).where(UserBase.id.in_(orphaned)))
+    return created
@@ -0,0 +1,162 @@
+import gzip
+import logging
+import os
+import stat
+import sys
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipResponder, IdentityResponder
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# xlsx is already a zip archive.
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+)
+PRECOMPRESS_SUFFIXES = {".html", ".js", ".css", ".svg", ".json"}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+logger = logging.getLogger(__name__)
+
+
+def accepted_encodings(accept_encoding: str) -> list[str]:
+    # Server preference order, not the client's: br, then gzip.
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if params and float(q) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip())
+    encodings = []
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        encodings.append("br")
+    if "gzip" in accepted or "*" in accepted:
+        encodings.append("gzip")
+    return encodings
+
+
+class _WeakEtagMixin:
+    # A compressed body is a different representation, so its validator can only be weak.
+    # etags.etag_matches() compares weakly, so revalidation keeps working.
+    async def __call__(self, scope, receive, send):
+        async def send_with_weak_etag(message):
+            if message["type"] == "http.response.start" and not self.content_encoding_set:
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/") and headers.get("content-encoding") == self.content_encoding:
+                    headers["ETag"] = f"W/{etag}"
+            await send(message)
+
+        await super().__call__(scope, receive, send_with_weak_etag)
+
+
+class _GzipResponder(_WeakEtagMixin, GZipResponder):
+    pass
+
+
+class _BrotliResponder(_WeakEtagMixin, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int, *, exclude_content_types: tuple[str, ...]):
+        super().__init__(app, minimum_size, exclude_content_types=exclude_content_types)
+        self._compressor = None
+        self.quality = quality
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    # Streamed bodies (CSV exports) are compressed chunk by chunk and flushed after
+    # each one, so the client still receives rows as they are produced.
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if "br" in encodings:
+            responder = _BrotliResponder(
+                self.app, self.minimum_size, BROTLI_QUALITY, exclude_content_types=EXCLUDED_CONTENT_TYPES
+            )
+        elif "gzip" in encodings:
+            responder = _GzipResponder(
+                self.app, self.minimum_size, GZIP_LEVEL, exclude_content_types=EXCLUDED_CONTENT_TYPES
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        await responder(scope, receive, send)
+
+
+def precompress(directory: Path) -> int:
+    written = 0
+    for path in directory.rglob("*"):
+        if path.suffix not in PRECOMPRESS_SUFFIXES or not path.is_file():
+            continue
+        data = None
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if encoding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            compressed = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+            target.write_bytes(compressed)
+            written += 1
+    return written
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    # Serves app.js.br / app.js.gz written by precompress() when the client accepts them,
+    # so static assets are never compressed per request. Uncompressed responses get their
+    # Vary header from CompressionMiddleware.
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse):
+            return response
+        request_headers = Headers(scope=scope)
+        for encoding in accepted_encodings(request_headers.get("accept-encoding", "")):
+            full_path, stat_result = await run_in_threadpool(self.lookup_path, path + ENCODING_SUFFIXES[encoding])
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            if response.stat_result is not None and stat_result.st_mtime < response.stat_result.st_mtime:
+                # Left over from an older build of the file.
+                continue
+            compressed = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=response.media_type,
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+            if self.is_not_modified(compressed.headers, request_headers):
+                return NotModifiedResponse(compressed.headers)
+            return compressed
+        return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parent.parent / "frontend"
+    logger.info("Wrote %s precompressed files in %s", precompress(target), target)
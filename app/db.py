@@ -1,8 +1,11 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
-from sqlalchemy import String, Integer, Boolean, Date, DateTime, create_engine, ForeignKey, Enum, UniqueConstraint, Index
+from sqlalchemy import String, Integer, Boolean, Date, DateTime, create_engine, ForeignKey, Enum, UniqueConstraint, Index, DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 import enum
+from collections.abc import AsyncIterator
 import os
-import bcrypt
 from datetime import date, datetime
 from dotenv import load_dotenv
 from sqlalchemy.exc import OperationalError, ProgrammingError
@@ -61,7 +64,8 @@ class AttendanceBase(Base):
     __tablename__ = "attendance"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    date: Mapped[date] = mapped_column(Date, nullable=False)
+    # In the primary key because the table is partitioned by date (see partitions.py).
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
     class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False)
     absent_name: Mapped[str] = mapped_column(String, nullable=False)
     status: Mapped[AttendanceStatusEnum] = mapped_column(Enum(AttendanceStatusEnum), nullable=False)
@@ -69,6 +73,15 @@ class AttendanceBase(Base):
     __table_args__ = (
         UniqueConstraint("date", "class_id", "absent_name", "status", name="uq_attendance"),
         Index("ix_attendance_class_date", "class_id", "date"),
+        # Daily statistics and exports read every column by date, in (date, class_id, id) order.
+        Index(
+            "ix_attendance_date_class_covering",
+            "date",
+            "class_id",
+            "id",
+            postgresql_include=["absent_name", "status", "reason"],
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
     )
 
 
@@ -76,14 +89,43 @@ class AttendanceFillBase(Base):
     __tablename__ = "attendance_fill"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    date: Mapped[date] = mapped_column(Date, nullable=False)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
     class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False)
     total_students: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     present_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    absent_unexcused: Mapped[list] = mapped_column(JSONB, nullable=False, default=list)
+    absent_excused: Mapped[list] = mapped_column(JSONB, nullable=False, default=list)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     filled_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     __table_args__ = (
         UniqueConstraint("date", "class_id", name="uq_attendance_fill"),
         Index("ix_attendance_fill_class_date", "class_id", "date"),
+        # Unfilled classes and the ETag query read only class_id and version for a date.
+        Index("ix_attendance_fill_date_class_covering", "date", "class_id", postgresql_include=["version"]),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
+
+
+# Days without their own partition yet land here until partitions.create_partition moves them.
+for _table in (AttendanceBase.__table__, AttendanceFillBase.__table__):
+    event.listen(_table, "after_create", DDL("CREATE TABLE %(table)s_default PARTITION OF %(table)s DEFAULT"))
+
+
+class AttendanceWeeklyBase(Base):
+    __tablename__ = "attendance_weekly"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    class_id: Mapped[int] = mapped_column(Integer, ForeignKey("classes.id"), nullable=False)
+    week_start: Mapped[date] = mapped_column(Date, nullable=False)
+    days_filled: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_students: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    present_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    absent_excused: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    absent_unexcused: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    __table_args__ = (
+        UniqueConstraint("class_id", "week_start", name="uq_attendance_weekly"),
+        Index("ix_attendance_weekly_week_start", "week_start"),
     )
 
 
@@ -100,8 +142,43 @@ DB_URL = os.getenv(
     f"?sslmode={DB_SSLMODE}&channel_binding={DB_CHANNEL_BINDING}",
 )
 
-engine = create_engine(DB_URL, echo=True)
+DB_ECHO = os.getenv("DB_ECHO", "off").lower() in {"1", "on", "true", "yes"}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+
+def _async_db_url(url: str) -> URL:
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    query.pop("channel_binding", None)
+    sslmode = query.pop("sslmode", None)
+    if sslmode:
+        query["ssl"] = sslmode
+    return parsed.set(drivername="postgresql+asyncpg", query=query)
+
+
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL") or _async_db_url(DB_URL)
+
+engine = create_engine(DB_URL, echo=DB_ECHO)
 SessionLocal = sessionmaker(engine)
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    echo=DB_ECHO,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as s:
+        try:
+            yield s
+            await s.commit()
+        except Exception:
+            await s.rollback()
+            raise
 
 
 def create_db_and_tables() -> None:
@@ -109,6 +186,9 @@ def create_db_and_tables() -> None:
 
 
 def seed_default_admin() -> None:
+    # Imported here: Alembic loads this module as app.db, without app/ on sys.path.
+    from passwords import hash_password_sync
+
     admin_login = os.getenv("ADMIN_LOGIN", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
     try:
@@ -116,7 +196,7 @@ def seed_default_admin() -> None:
             existing = s.query(UserBase).filter(UserBase.login == admin_login).first()
             if existing:
                 return
-            hashed = bcrypt.hashpw(admin_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+            hashed = hash_password_sync(admin_password)
             user = UserBase(login=admin_login, password=hashed, role=RoleEnum.admin)
             s.add(user)
             s.commit()
@@ -0,0 +1,141 @@
+import csv
+import os
+from collections import Counter
+from collections.abc import AsyncIterator, Iterator
+from datetime import date
+from io import StringIO
+from tempfile import SpooledTemporaryFile
+
+from openpyxl import Workbook
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from class_directory import ClassEntry
+from db import AsyncSessionLocal, AttendanceBase, ClassBase
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_MAX_RANGE_DAYS = int(os.getenv("EXPORT_MAX_RANGE_DAYS", "366"))
+EXPORT_SPOOL_MAX_BYTES = 1024 * 1024
+EXPORT_READ_BYTES = 64 * 1024
+UNEXCUSED_REASON = "Неуважительная причина"
+DETAILS_HEADER = ["Date", "Class ID", "Class Name", "Full Name", "Reason"]
+SUMMARY_HEADER = ["Date", "Class ID", "Class Name", "Total absent"]
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+
+async def iter_absent_rows(
+    s: AsyncSession, class_rows: tuple[ClassEntry, ...], date_from: date, date_to: date
+) -> AsyncIterator[list[list]]:
+    if not class_rows:
+        return
+    stmt = (
+        select(
+            AttendanceBase.date,
+            AttendanceBase.class_id,
+            ClassBase.name,
+            AttendanceBase.absent_name,
+            AttendanceBase.reason,
+        )
+        .join(ClassBase, ClassBase.id == AttendanceBase.class_id)
+        .where(
+            AttendanceBase.class_id.in_([row.id for row in class_rows]),
+            AttendanceBase.date >= date_from,
+            AttendanceBase.date <= date_to,
+        )
+        .order_by(AttendanceBase.date, AttendanceBase.class_id, AttendanceBase.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    result = await s.stream(stmt)
+    async for partition in result.partitions():
+        yield [
+            [row_date.isoformat(), class_id, class_name, absent_name, reason or UNEXCUSED_REASON]
+            for row_date, class_id, class_name, absent_name, reason in partition
+        ]
+
+
+def summary_rows(class_rows: tuple[ClassEntry, ...], totals: Counter, period: str) -> list[list]:
+    rows = [[period, row.id, row.name, totals[row.id]] for row in class_rows]
+    rows.append([period, "-", "TOTAL", sum(totals[row.id] for row in class_rows)])
+    return rows
+
+
+def _append_rows(sheet, rows: list[list]) -> None:
+    for row in rows:
+        sheet.append(row)
+
+
+def _set_widths(sheet, widths: list[int]) -> None:
+    for column, width in zip("ABCDE", widths):
+        sheet.column_dimensions[column].width = width
+
+
+async def build_xlsx(
+    chunks: AsyncIterator[list[list]], class_rows: tuple[ClassEntry, ...], period: str
+) -> SpooledTemporaryFile:
+    # Write-only sheets keep one row in memory; openpyxl spills them to temp files until save().
+    workbook = Workbook(write_only=True)
+    details_sheet = workbook.create_sheet("Absent details")
+    _set_widths(details_sheet, [14, 10, 24, 28, 28])
+    details_sheet.append(DETAILS_HEADER)
+    totals = Counter()
+    async for chunk in chunks:
+        await run_in_threadpool(_append_rows, details_sheet, chunk)
+        totals.update(row[1] for row in chunk)
+    if not totals:
+        details_sheet.append([period, "-", "-", "No absences", "-"])
+
+    summary_sheet = workbook.create_sheet("Summary")
+    _set_widths(summary_sheet, [14, 10, 24, 14])
+    summary_sheet.append(SUMMARY_HEADER)
+    _append_rows(summary_sheet, summary_rows(class_rows, totals, period))
+
+    output = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    try:
+        await run_in_threadpool(workbook.save, output)
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+async def stream_csv(
+    class_rows: tuple[ClassEntry, ...], date_from: date, date_to: date, period: str
+) -> AsyncIterator[bytes]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    # Same bytes as encoding the whole report with utf-8-sig, so Excel still detects UTF-8.
+    buffer.write("\ufeff")
+    writer.writerow(DETAILS_HEADER)
+    yield drain()
+
+    totals = Counter()
+    # The response body outlives the request-scoped session, so the stream reads through its own.
+    async with AsyncSessionLocal() as s:
+        async for chunk in iter_absent_rows(s, class_rows, date_from, date_to):
+            writer.writerows(chunk)
+            totals.update(row[1] for row in chunk)
+            yield drain()
+    if not totals:
+        writer.writerow([period, "-", "-", "No absences", "-"])
+
+    writer.writerow([])
+    writer.writerow(["Summary"])
+    writer.writerow(SUMMARY_HEADER)
+    writer.writerows(summary_rows(class_rows, totals, period))
+    yield drain()
+
+
+def iter_file(file) -> Iterator[bytes]:
+    with file:
+        while chunk := file.read(EXPORT_READ_BYTES):
+            yield chunk
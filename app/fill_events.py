@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from class_directory import CLASS_DIRECTORY_CHANNEL
+from notifications import listener, notify
+
+FILL_EVENTS_CHANNEL = "attendance_fill"
+SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# Streams end after this long and clients reconnect: it bounds how long a graceful
+# shutdown waits on open streams and spreads reconnects across workers.
+SSE_MAX_AGE_SECONDS = int(os.getenv("SSE_MAX_AGE_SECONDS", "300"))
+SSE_QUEUE_SIZE = 100
+# pg_notify payloads are capped at 8000 bytes; this many ids stays well under it.
+NOTIFY_MAX_CLASS_IDS = 500
+
+
+async def publish_fills(s: AsyncSession, days: Iterable[tuple[int, date]]) -> None:
+    # Sent through pg_notify, so every worker (this one included) hears about the save
+    # only once its transaction commits.
+    class_ids_by_date = defaultdict(set)
+    for class_id, day in days:
+        class_ids_by_date[day].add(class_id)
+    for day, class_ids in sorted(class_ids_by_date.items()):
+        class_ids = sorted(class_ids)
+        for i in range(0, len(class_ids), NOTIFY_MAX_CLASS_IDS):
+            payload = {"date": day.isoformat(), "classIds": class_ids[i : i + NOTIFY_MAX_CLASS_IDS]}
+            await notify(s, FILL_EVENTS_CHANNEL, json.dumps(payload))
+
+
+class FillEventBroker:
+    # In-process fan-out of LISTEN notifications to the open event streams of this worker.
+    def __init__(self):
+        self._queues: set[asyncio.Queue] = set()
+
+    def _broadcast(self, event: tuple[str, dict]) -> None:
+        for queue in self._queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client too slow to drain its queue gets a resync instead of a backlog.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    def on_fill(self, payload: str | None) -> None:
+        # None means the LISTEN connection was (re)established and events may have been missed.
+        self._broadcast(("resync", {}) if payload is None else ("fill", json.loads(payload)))
+
+    def on_classes_changed(self, payload: str | None) -> None:
+        self._broadcast(("classes", {}))
+
+    async def stream(self, class_ids: frozenset[int] | None = None) -> AsyncIterator[str]:
+        # class_ids limits fill events to those classes; None streams every class.
+        queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._queues.add(queue)
+        expires_at = time.monotonic() + SSE_MAX_AGE_SECONDS
+        try:
+            yield f"retry: {SSE_KEEPALIVE_SECONDS * 1000}\n\n"
+            while (remaining := expires_at - time.monotonic()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(SSE_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                name, data = event
+                if name == "fill" and class_ids is not None:
+                    data = {**data, "classIds": [class_id for class_id in data["classIds"] if class_id in class_ids]}
+                    if not data["classIds"]:
+                        continue
+                yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self._queues.discard(queue)
+
+    def close(self) -> None:
+        for queue in self._queues:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+broker = FillEventBroker()
+listener.subscribe(FILL_EVENTS_CHANNEL, broker.on_fill)
+listener.subscribe(CLASS_DIRECTORY_CHANNEL, broker.on_classes_changed)
@@ -0,0 +1,159 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "on").lower() not in {"0", "off", "false", "no"}
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_SAMPLE_RATE = float(os.getenv("SQL_SAMPLE_RATE", "0.1"))
+# Debug only: per-request SQL counts in response headers reveal how much work an endpoint does.
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "off").lower() in {"1", "on", "true", "yes"}
+SQL_STATEMENTS_HEADER = "X-SQL-Statements"
+SQL_ROUND_TRIPS_HEADER = "X-SQL-Round-Trips"
+SQL_TIME_HEADER = "X-SQL-Time-Ms"
+SQL_STATS_MAX_STATEMENTS = 200
+SQL_STATS_TOP = 20
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestSqlStats:
+    # executemany runs one statement per parameter set in a single round trip.
+    statements: int = 0
+    round_trips: int = 0
+    db_ms: float = 0.0
+
+
+@dataclass
+class _StatementStats:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+_current_request: ContextVar[RequestSqlStats | None] = ContextVar("sql_request_stats", default=None)
+_lock = threading.Lock()
+_statements: dict[str, _StatementStats] = {}
+_totals = {"statements": 0, "totalMs": 0.0, "slowStatements": 0, "requests": 0, "requestStatements": 0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    request_stats = _current_request.get()
+    if request_stats is not None:
+        request_stats.statements += len(parameters) if executemany else 1
+        request_stats.round_trips += 1
+        request_stats.db_ms += elapsed_ms
+    with _lock:
+        _totals["statements"] += 1
+        _totals["totalMs"] += elapsed_ms
+        stats = _statements.get(statement)
+        if stats is None and len(_statements) < SQL_STATS_MAX_STATEMENTS:
+            stats = _statements[statement] = _StatementStats()
+        if stats is not None:
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+        if elapsed_ms >= SQL_SLOW_QUERY_MS:
+            _totals["slowStatements"] += 1
+    if elapsed_ms >= SQL_SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed_ms, " ".join(statement.split()))
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not SQL_INSTRUMENTATION:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def current_request_stats() -> RequestSqlStats | None:
+    return _current_request.get()
+
+
+def sql_stats_snapshot() -> dict:
+    with _lock:
+        top = sorted(_statements.items(), key=lambda item: item[1].total_ms, reverse=True)[:SQL_STATS_TOP]
+        totals = dict(_totals)
+    requests = totals["requests"]
+    return {
+        "enabled": SQL_INSTRUMENTATION,
+        "sampleRate": SQL_SAMPLE_RATE,
+        "slowQueryMs": SQL_SLOW_QUERY_MS,
+        "statements": totals["statements"],
+        "totalMs": round(totals["totalMs"], 3),
+        "slowStatements": totals["slowStatements"],
+        "requests": requests,
+        "avgStatementsPerRequest": round(totals["requestStatements"] / requests, 2) if requests else 0,
+        "topStatements": [
+            {
+                "statement": " ".join(statement.split()),
+                "count": stats.count,
+                "totalMs": round(stats.total_ms, 3),
+                "maxMs": round(stats.max_ms, 3),
+            }
+            for statement, stats in top
+        ],
+    }
+
+
+def reset_sql_stats() -> None:
+    with _lock:
+        _statements.clear()
+        for key in _totals:
+            _totals[key] = 0
+
+
+class SqlInstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_INSTRUMENTATION:
+            await self.app(scope, receive, send)
+            return
+        request_stats = RequestSqlStats()
+        token = _current_request.set(request_stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SQL_DEBUG_HEADERS:
+                    # Counts up to the start of the response; streamed bodies may query later.
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers[SQL_STATEMENTS_HEADER] = str(request_stats.statements)
+                    headers[SQL_ROUND_TRIPS_HEADER] = str(request_stats.round_trips)
+                    headers[SQL_TIME_HEADER] = f"{request_stats.db_ms:.1f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            with _lock:
+                _totals["requests"] += 1
+                _totals["requestStatements"] += request_stats.statements
+            if request_stats.statements and random.random() < SQL_SAMPLE_RATE:
+                logger.info(
+                    "%s %s %s queries=%d round_trips=%d db_ms=%.1f",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    request_stats.statements,
+                    request_stats.round_trips,
+                    request_stats.db_ms,
+                )
@@ -3,23 +3,40 @@ import logging
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import db
+import compression
+import fill_events
+import instrumentation
+import metrics
+import notifications
+import passwords
+import retention
+from responses import OrjsonResponse
 from dotenv import load_dotenv
-from routes import teacher
+from routes import admin, teacher
 
 load_dotenv('app/.env')
 engine = db.engine
 
-app = FastAPI()
+instrumentation.instrument_engine(engine)
+instrumentation.instrument_engine(db.async_engine.sync_engine)
+metrics.instrument_sessions()
+metrics.register_pool_gauges(db.async_engine.pool)
+
+app = FastAPI(default_response_class=OrjsonResponse)
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(instrumentation.SqlInstrumentationMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 app.include_router(teacher.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 logger = logging.getLogger(__name__)
 frontend_dir = Path(__file__).resolve().parent.parent / "frontend"
 
 if frontend_dir.exists():
-    app.mount("/frontend", StaticFiles(directory=str(frontend_dir)), name="frontend")
+    frontend_files = compression.PrecompressedStaticFiles(directory=str(frontend_dir))
+    app.mount("/frontend", frontend_files, name="frontend")
 
 
 @app.exception_handler(HTTPException)
@@ -35,6 +52,15 @@ async def validation_exception_handler(_: Request, exc: RequestValidationError):
     return JSONResponse(status_code=400, content={"message": message})
 
 
+@app.exception_handler(passwords.PasswordHasherBusy)
+async def password_hasher_busy_handler(_: Request, exc: passwords.PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server is busy, try again later"},
+        headers={"Retry-After": str(passwords.BCRYPT_RETRY_AFTER_SECONDS)},
+    )
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(_: Request, exc: Exception):
     logger.exception("Unhandled exception: %s", exc)
@@ -42,8 +68,25 @@ async def unhandled_exception_handler(_: Request, exc: Exception):
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     db.seed_default_admin()
+    if frontend_dir.exists():
+        try:
+            compression.precompress(frontend_dir)
+        except OSError as exc:
+            logger.warning("Could not precompress frontend assets, serving them uncompressed: %s", exc)
+    passwords.hasher.start()
+    app.state.retention_task = retention.start_retention_scheduler()
+    notifications.listener.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await retention.stop_retention_scheduler(getattr(app.state, "retention_task", None))
+    fill_events.broker.close()
+    await notifications.listener.stop()
+    passwords.hasher.shutdown()
+    await db.async_engine.dispose()
 
 
 @app.get("/api/ping")
@@ -51,10 +94,15 @@ async def ping():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/", include_in_schema=False)
-async def serve_frontend():
+async def serve_frontend(request: Request):
     if frontend_dir.exists():
-        return FileResponse(frontend_dir / "index.html")
+        return await frontend_files.get_response("index.html", request.scope)
     return JSONResponse(status_code=404, content={"message": "Frontend not found"})
 
 
@@ -0,0 +1,271 @@
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abc.abstractmethod
+    def _samples(self) -> list[str]: ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        if self._collect is not None:
+            self._collect(self)
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1], series[2])) for key, series in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds", "HTTP request latency by route, event streams excluded.", ("method", "route")
+    )
+)
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests currently being served."))
+DB_POOL_CHECKOUT = REGISTRY.register(
+    Histogram(
+        "db_pool_checkout_seconds",
+        "Time a session waited for a pooled connection.",
+        buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+    )
+)
+BCRYPT_DURATION = REGISTRY.register(
+    Histogram(
+        "bcrypt_duration_seconds",
+        "Time spent hashing or checking passwords.",
+        ("operation",),
+        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    )
+)
+
+BCRYPT_PENDING = REGISTRY.register(
+    Gauge("bcrypt_pending", "Password hashing jobs queued or running in the bcrypt pool.")
+)
+BCRYPT_REJECTED = REGISTRY.register(
+    Counter("bcrypt_rejected_total", "Password hashing jobs shed because the bcrypt pool was full.", ("operation",))
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _route_label(scope, root_path: str) -> str:
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        # A mounted app (the static frontend) sets no route, only extends root_path by its mount path.
+        mount_path = scope.get("root_path", "")[len(root_path) :]
+        return mount_path or "unmatched"
+    # Routes from an included router may carry their path without the router prefix.
+    path = scope["path"]
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is not None:
+        for index, char in enumerate(path):
+            if char == "/" and path_regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+def register_pool_gauges(pool) -> None:
+    def collect(gauge: Gauge) -> None:
+        gauge.set(pool.size(), state="size")
+        gauge.set(pool.checkedout(), state="checked_out")
+        gauge.set(pool.checkedin(), state="idle")
+        gauge.set(pool.overflow(), state="overflow")
+
+    REGISTRY.register(Gauge("db_pool_connections", "Connection pool state.", ("state",), collect=collect))
+
+
+def instrument_sessions() -> None:
+    # A session checks out its connection between the first execute and after_begin.
+    @event.listens_for(Session, "do_orm_execute")
+    def _mark_checkout_start(orm_execute_state):
+        session = orm_execute_state.session
+        if not session.in_transaction():
+            session.info["checkout_started"] = time.perf_counter()
+
+    @event.listens_for(Session, "after_begin")
+    def _observe_checkout(session, transaction, connection):
+        started = session.info.pop("checkout_started", None)
+        if started is not None:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        streaming = False
+        root_path = scope.get("root_path", "")
+
+        async def send_wrapper(message):
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                streaming = any(
+                    name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", [])
+                )
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = _route_label(scope, root_path)
+            # An event stream lasts as long as the client stays connected; it is not a latency.
+            if not streaming:
+                HTTP_LATENCY.observe(elapsed, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status_code)
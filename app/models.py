@@ -1,4 +1,12 @@
-from pydantic import BaseModel, Field
+import os
+from datetime import date
+
+from pydantic import BaseModel, ConfigDict, Field
+from pydantic.alias_generators import to_camel
+
+ATTENDANCE_BATCH_MAX_ITEMS = int(os.getenv("ATTENDANCE_BATCH_MAX_ITEMS", "500"))
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 500
 
 
 class LoginRequest(BaseModel):
@@ -36,3 +44,120 @@ class AttendanceRequest(BaseModel):
     present_count: int = Field(alias="presentCount")
     absent_unexcused: list[str] = Field(default_factory=list, alias="absentUnexcused")
     absent_excused: list[ExcusedAbsenceRequest] = Field(default_factory=list, alias="absentExcused")
+
+
+class AttendanceBatchItem(AttendanceRequest):
+    date: date
+
+
+class AttendanceBatchRequest(BaseModel):
+    items: list[AttendanceBatchItem] = Field(min_length=1, max_length=ATTENDANCE_BATCH_MAX_ITEMS)
+
+
+class CamelModel(BaseModel):
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
+
+
+class UnexcusedAbsence(CamelModel):
+    full_name: str
+
+
+class ExcusedAbsence(CamelModel):
+    full_name: str
+    reason: str
+
+
+class AttendanceResponse(CamelModel):
+    date: date
+    class_id: int
+    is_filled: bool
+    total_students: int
+    present_count: int
+    absent_unexcused: list[UnexcusedAbsence]
+    absent_excused: list[ExcusedAbsence]
+
+
+class DailyStatisticsAbsentItem(CamelModel):
+    full_name: str
+    class_id: int
+    class_name: str
+    reason: str
+
+
+class DailyStatisticsResponse(CamelModel):
+    date: date
+    class_id: int
+    class_name: str
+    total_absent: int
+    absent: list[DailyStatisticsAbsentItem]
+
+
+class WeeklyStatisticsResponse(CamelModel):
+    week_start: date
+    week_end: date
+    class_id: int
+    class_name: str
+    days_filled: int
+    total_students: int
+    present_count: int
+    absent_excused: int
+    absent_unexcused: int
+
+
+class UnfilledClassResponse(CamelModel):
+    id: int
+    name: str
+    teacher_id: int
+    teacher_login: str | None
+
+
+class AttendanceBatchResult(CamelModel):
+    index: int
+    date: date
+    class_id: int | None
+    status: int
+    message: str
+
+
+class AttendanceBatchResponse(CamelModel):
+    saved: int
+    results: list[AttendanceBatchResult]
+
+
+class ClassImportResult(CamelModel):
+    line: int
+    name: str
+    status: int
+    message: str
+
+
+class ClassImportResponse(CamelModel):
+    created: int
+    results: list[ClassImportResult]
+
+
+class UserResponse(CamelModel):
+    id: int
+    login: str
+    role: str
+    class_id: int | None
+    promoted_by: int | None
+
+
+class ClassResponse(CamelModel):
+    id: int
+    name: str
+    teacher_id: int
+    teacher_login: str | None
+
+
+class UserPage(CamelModel):
+    items: list[UserResponse]
+    total: int
+    next_cursor: int | None
+
+
+class ClassPage(CamelModel):
+    items: list[ClassResponse]
+    total: int
+    next_cursor: int | None
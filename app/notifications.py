@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Callable
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import async_engine
+
+NOTIFY_KEEPALIVE_SECONDS = 10
+NOTIFY_RECONNECT_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+async def notify(s: AsyncSession, channel: str, payload: str = "") -> None:
+    # pg_notify is transactional: listeners only see it once the surrounding transaction commits.
+    await s.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class PgListener:
+    def __init__(self):
+        self._handlers: dict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: Callable[[str | None], None]) -> None:
+        # Handlers get the payload of each notification, or None after (re)connecting,
+        # when notifications may have been missed.
+        self._handlers[channel].append(handler)
+
+    def _dispatch(self, channel: str, payload: str | None) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Notification handler for %s failed", channel)
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:
+        self._dispatch(channel, payload)
+
+    async def _listen_once(self) -> None:
+        _, connect_params = async_engine.dialect.create_connect_args(async_engine.url)
+        connection = await asyncpg.connect(**connect_params)
+        try:
+            for channel in self._handlers:
+                await connection.add_listener(channel, self._on_notification)
+                self._dispatch(channel, None)
+            while True:
+                await asyncio.sleep(NOTIFY_KEEPALIVE_SECONDS)
+                await connection.execute("SELECT 1")
+        finally:
+            await connection.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN connection lost, reconnecting in %s s", NOTIFY_RECONNECT_SECONDS)
+            await asyncio.sleep(NOTIFY_RECONNECT_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None and self._handlers:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+listener = PgListener()
@@ -0,0 +1,88 @@
+import os
+import re
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+# attendance and attendance_fill are partitioned by date, one partition per day, so expired
+# history is dropped a day at a time instead of deleted row by row.
+PARTITIONED_TABLES = ("attendance", "attendance_fill")
+PARTITION_PREMAKE_DAYS = int(os.getenv("PARTITION_PREMAKE_DAYS", "14"))
+# Partition DDL gives up instead of queueing every request behind a long-running query.
+PARTITION_LOCK_TIMEOUT = "5s"
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(
+        conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+        ).scalar()
+    )
+
+
+def partition_days(conn, table: str) -> dict[date, str]:
+    pattern = re.compile(rf"{re.escape(table)}_p(\d{{8}})")
+    names = conn.execute(
+        text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(:table)"),
+        {"table": table},
+    ).scalars()
+    days = {}
+    for name in names:
+        if match := pattern.fullmatch(name):
+            days[date(int(match[1][:4]), int(match[1][4:6]), int(match[1][6:]))] = name
+    return days
+
+
+def create_partition(conn, table: str, day: date) -> str:
+    # Built beside the table and then attached: ATTACH PARTITION takes only a SHARE UPDATE
+    # EXCLUSIVE lock on the parent, CREATE TABLE ... PARTITION OF would block reads and writes.
+    name = partition_name(table, day)
+    default = default_partition_name(table)
+    conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+    # Nothing may reach the default partition for this day between the move and the attach.
+    conn.execute(text(f"LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    conn.execute(
+        text(f"WITH moved AS (DELETE FROM {default} WHERE date = :day RETURNING *) INSERT INTO {name} SELECT * FROM moved"),
+        {"day": day},
+    )
+    conn.execute(
+        text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')")
+    )
+    return name
+
+
+def ensure_partitions(conn, table: str, first_day: date, last_day: date) -> list[str]:
+    # One transaction per partition keeps each lock short.
+    existing = partition_days(conn, table)
+    created = []
+    day = first_day
+    while day <= last_day:
+        if day not in existing:
+            created.append(create_partition(conn, table, day))
+            conn.commit()
+        day += timedelta(days=1)
+    return created
+
+
+def drop_partitions_before(conn, table: str, cutoff_date: date) -> list[str]:
+    dropped = []
+    for day, name in sorted(partition_days(conn, table).items()):
+        if day >= cutoff_date:
+            break
+        conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+        # DETACH ... CONCURRENTLY is not allowed while a default partition exists; a plain
+        # DETACH holds the parent's ACCESS EXCLUSIVE lock only for the catalog update.
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        conn.commit()
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from metrics import BCRYPT_DURATION, BCRYPT_PENDING, BCRYPT_REJECTED
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 8)))
+BCRYPT_RETRY_AFTER_SECONDS = 1
+# Passwords per bulk job: an interactive hash queued behind one waits for a few hashes at most.
+BCRYPT_BULK_CHUNK = 4
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def hash_password_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>.
+    parts = hashed.split("$")
+    return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != BCRYPT_ROUNDS
+
+
+def _timed_hash(password: str, rounds: int) -> tuple[str, float]:
+    started = time.perf_counter()
+    hashed = hash_password_sync(password, rounds)
+    return hashed, time.perf_counter() - started
+
+
+def _timed_hash_many(passwords: list[str], rounds: int) -> tuple[list[str], list[float]]:
+    results = [_timed_hash(password, rounds) for password in passwords]
+    return [hashed for hashed, _ in results], [elapsed for _, elapsed in results]
+
+
+def _timed_check(password: str, hashed: str) -> tuple[bool, float]:
+    started = time.perf_counter()
+    ok = bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    return ok, time.perf_counter() - started
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._bulk_lanes = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the server process holds threads and pooled DB sockets.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _submit(self, operation: str, fn, *args):
+        if self._pending >= self.max_pending:
+            BCRYPT_REJECTED.inc(operation=operation)
+            raise PasswordHasherBusy()
+        self._pending += 1
+        BCRYPT_PENDING.inc()
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            self._executor = None
+            BCRYPT_REJECTED.inc(operation=operation)
+            raise PasswordHasherBusy()
+        finally:
+            self._pending -= 1
+            BCRYPT_PENDING.dec()
+        for duration in elapsed if isinstance(elapsed, list) else (elapsed,):
+            BCRYPT_DURATION.observe(duration, operation=operation)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _timed_hash, password, BCRYPT_ROUNDS)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        # Bulk hashing (CSV import) runs small chunks on at most workers - 1 processes, so one
+        # stays free for logins. Each chunk in flight takes a pending slot like any other job.
+        if not passwords:
+            return []
+        chunks = [passwords[i : i + BCRYPT_BULK_CHUNK] for i in range(0, len(passwords), BCRYPT_BULK_CHUNK)]
+        lanes = min(len(chunks), max(1, self.workers - 1) - self._bulk_lanes)
+        if lanes <= 0:
+            BCRYPT_REJECTED.inc(operation="hash")
+            raise PasswordHasherBusy()
+        results: list[list[str]] = [[] for _ in chunks]
+        queue = iter(range(len(chunks)))
+
+        async def lane() -> None:
+            for index in queue:
+                results[index] = await self._submit("hash", _timed_hash_many, chunks[index], BCRYPT_ROUNDS)
+
+        self._bulk_lanes += lanes
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(lanes):
+                    group.create_task(lane())
+        except* PasswordHasherBusy:
+            raise PasswordHasherBusy() from None
+        finally:
+            self._bulk_lanes -= lanes
+        return [hashed for chunk in results for hashed in chunk]
+
+    async def check(self, password: str, hashed: str) -> bool:
+        return await self._submit("check", _timed_check, password, hashed)
+
+    def start(self) -> None:
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher(BCRYPT_WORKERS, BCRYPT_MAX_PENDING)
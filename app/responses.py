@@ -0,0 +1,9 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class OrjsonResponse(JSONResponse):
+    # fastapi.responses.ORJSONResponse is deprecated; same output as JSONResponse
+    # (compact, non-ASCII kept), just encoded by orjson.
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Table, delete, select, text
+
+from db import AttendanceBase, AttendanceFillBase, engine
+from partitions import PARTITION_PREMAKE_DAYS, drop_partitions_before, ensure_partitions, is_partitioned
+
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "7"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+# Arbitrary application-wide key for pg_try_advisory_lock; only one worker runs retention at a time.
+RETENTION_LOCK_KEY = 73150001
+
+# Weekly rollups freeze once retention reaches their Monday (see weekly_stats._open_weeks);
+# a window of at least a week keeps the current week open to new saves.
+if HISTORY_RETENTION_DAYS < 7:
+    raise RuntimeError(f"HISTORY_RETENTION_DAYS must be at least 7, got {HISTORY_RETENTION_DAYS}")
+
+logger = logging.getLogger(__name__)
+# Set on shutdown; a run in its worker thread stops at the next batch instead of outliving the engine.
+_stop_requested = threading.Event()
+
+
+def retention_cutoff(today: date | None = None) -> date:
+    current_date = today or datetime.now().date()
+    return current_date - timedelta(days=HISTORY_RETENTION_DAYS - 1)
+
+
+def _delete_expired_batch(conn, table: Table, cutoff_date: date, batch_size: int) -> int:
+    expired_ids = select(table.c.id).where(table.c.date < cutoff_date).limit(batch_size).scalar_subquery()
+    # The date condition lets the outer DELETE skip every partition that cannot hold expired rows.
+    result = conn.execute(delete(table).where(table.c.date < cutoff_date, table.c.id.in_(expired_ids)))
+    return result.rowcount
+
+
+def _purge_table(conn, table: Table, cutoff_date: date, batch_size: int) -> int:
+    removed = 0
+    while not _stop_requested.is_set():
+        deleted = _delete_expired_batch(conn, table, cutoff_date, batch_size)
+        conn.commit()
+        removed += deleted
+        if deleted < batch_size:
+            break
+    return removed
+
+
+def run_retention(batch_size: int = RETENTION_BATCH_SIZE) -> dict | None:
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": RETENTION_LOCK_KEY}).scalar()
+        conn.commit()
+        if not acquired:
+            return None
+        try:
+            today = datetime.now().date()
+            cutoff_date = retention_cutoff(today)
+            report = {"cutoff": cutoff_date.isoformat(), "createdPartitions": 0, "droppedPartitions": 0}
+            for table in (AttendanceBase.__table__, AttendanceFillBase.__table__):
+                if is_partitioned(conn, table.name):
+                    created = ensure_partitions(conn, table.name, today, today + timedelta(days=PARTITION_PREMAKE_DAYS))
+                    report["createdPartitions"] += len(created)
+                    report["droppedPartitions"] += len(drop_partitions_before(conn, table.name, cutoff_date))
+                # Whole expired days are gone with their partitions; what is left to delete row by
+                # row sits in the default partition (days saved without a partition of their own).
+                report[table.name] = _purge_table(conn, table, cutoff_date, batch_size)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RETENTION_LOCK_KEY})
+            conn.commit()
+    logger.info(
+        "Retention dropped %s partitions, deleted %s attendance and %s attendance_fill rows older than %s "
+        "and created %s partitions ahead",
+        report["droppedPartitions"],
+        report["attendance"],
+        report["attendance_fill"],
+        report["cutoff"],
+        report["createdPartitions"],
+    )
+    return report
+
+
+async def _retention_loop(interval_seconds: int) -> None:
+    while True:
+        run = asyncio.ensure_future(asyncio.to_thread(run_retention))
+        try:
+            await asyncio.shield(run)
+        except asyncio.CancelledError:
+            # Cancelling cannot stop the worker thread: wait for it to notice _stop_requested.
+            await asyncio.wait([run])
+            raise
+        except Exception:
+            logger.exception("Retention run failed")
+        if interval_seconds <= 0:
+            return
+        await asyncio.sleep(interval_seconds)
+
+
+def start_retention_scheduler(interval_seconds: int = RETENTION_INTERVAL_SECONDS) -> asyncio.Task:
+    _stop_requested.clear()
+    return asyncio.create_task(_retention_loop(interval_seconds))
+
+
+async def stop_retention_scheduler(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    _stop_requested.set()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
@@ -1,12 +1,18 @@
-from fastapi import APIRouter
-from db import engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import APIRouter, Request
+
+from db import RoleEnum
+from instrumentation import reset_sql_stats, sql_stats_snapshot
+from routes.teacher import _get_token_payload, _require_role
 
 
 router = APIRouter()
-session = sessionmaker(engine)
 
 
-@router.post("/api/add_teacher")
-async def add_teacher():
-    pass
\ No newline at end of file
+@router.get("/admin/sql-stats")
+async def get_sql_stats(request: Request, reset: bool = False):
+    token_payload = _get_token_payload(request)
+    _require_role(token_payload, {RoleEnum.admin.value})
+    snapshot = sql_stats_snapshot()
+    if reset:
+        reset_sql_stats()
+    return snapshot
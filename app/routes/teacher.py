@@ -1,41 +1,71 @@
+from bisect import bisect_right
 from datetime import date, datetime, timedelta
+from typing import Annotated, Literal
 from collections import defaultdict
-import csv
-from io import BytesIO
-from io import StringIO
+from dataclasses import dataclass
 
-import bcrypt
 import jwt
-from fastapi import APIRouter, HTTPException, Request, status
-from fastapi.responses import Response
-from openpyxl import Workbook
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import Date, Integer, String, and_, bindparam, cast, column, delete, exists, func, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from class_directory import ClassEntry, DirectorySnapshot, directory, mark_changed
+from class_import import insert_classes, parse_class_csv, taken_names
 from db import (
     AttendanceBase,
     AttendanceFillBase,
     AttendanceStatusEnum,
+    AttendanceWeeklyBase,
     ClassBase,
     RoleEnum,
     StudentBase,
     UserBase,
-    engine,
+    get_session,
+)
+from etags import make_etag, not_modified
+from fill_events import broker, publish_fills
+from exports import (
+    CSV_MEDIA_TYPE,
+    EXPORT_MAX_RANGE_DAYS,
+    XLSX_MEDIA_TYPE,
+    build_xlsx,
+    iter_absent_rows,
+    iter_file,
+    stream_csv,
 )
 from models import (
+    PAGE_DEFAULT_LIMIT,
+    PAGE_MAX_LIMIT,
+    AttendanceBatchRequest,
+    AttendanceBatchResponse,
+    AttendanceBatchResult,
     AttendanceRequest,
+    AttendanceResponse,
+    ClassImportResponse,
+    ClassImportResult,
+    ClassPage,
+    ClassResponse,
     CreateClassRequest,
+    DailyStatisticsAbsentItem,
+    DailyStatisticsResponse,
     LoginRequest,
+    UnfilledClassResponse,
     UpdateClassCredentialsRequest,
     UpdateCredentialsRequest,
     UpdateRoleRequest,
+    UserPage,
+    UserResponse,
+    WeeklyStatisticsResponse,
 )
+from passwords import PasswordHasherBusy, hasher, needs_rehash
 from utils.jwt import RANDOM_SECRET, create_jwt
+from weekly_stats import lock_weeks, refresh_weeks, week_start
 
 router = APIRouter()
-session = sessionmaker(engine)
-HISTORY_RETENTION_DAYS = 7
+SessionDep = Annotated[AsyncSession, Depends(get_session, scope="function")]
 
 
 def _normalize_absent_name(value: str) -> str:
@@ -65,677 +95,855 @@ def _require_role(payload: dict, allowed: set[str]) -> None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
 
-def _get_current_user(s, payload: dict) -> UserBase:
-    user = s.query(UserBase).filter(UserBase.id == int(payload["sub"])).first()
+async def _get_current_user(s: AsyncSession, payload: dict) -> UserBase:
+    user = await s.scalar(select(UserBase).where(UserBase.id == int(payload["sub"])))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     return user
 
 
-def _resolve_class_for_user(payload: dict, requested_class_id: int | None) -> int:
+async def _resolve_class_for_user(s: AsyncSession, payload: dict, requested_class_id: int | None) -> int:
     if requested_class_id is not None:
         return requested_class_id
     if payload["role"] == RoleEnum.admin.value:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="classId is required for admin")
-    with session() as s:
-        owned_class = (
-            s.query(ClassBase)
-            .filter(ClassBase.teacher_id == int(payload["sub"]))
-            .order_by(ClassBase.id.asc())
-            .first()
-        )
-        if not owned_class:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-        return owned_class.id
+    owned_classes = (await directory.snapshot(s)).for_teacher(int(payload["sub"]))
+    if not owned_classes:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
+    return owned_classes[0].id
+
+
+async def _get_accessible_class(s: AsyncSession, payload: dict, requested_class_id: int | None) -> ClassEntry:
+    resolved_class_id = await _resolve_class_for_user(s, payload, requested_class_id)
+    class_row = (await directory.snapshot(s)).by_id.get(resolved_class_id)
+    if not class_row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
+    if payload["role"] == RoleEnum.teacher.value and class_row.teacher_id != int(payload["sub"]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return class_row
+
+
+async def _classes_for_user(s: AsyncSession, payload: dict) -> tuple[ClassEntry, ...]:
+    snapshot = await directory.snapshot(s)
+    if payload["role"] == RoleEnum.admin.value:
+        return snapshot.classes
+    return snapshot.for_teacher(int(payload["sub"]))
 
 
-def _attendance_for_class(s, current_date: date, class_id: int) -> dict:
-    attendance_rows = (
-        s.query(AttendanceBase)
-        .filter(and_(AttendanceBase.class_id == class_id, AttendanceBase.date == current_date))
-        .all()
+def _class_response(row: ClassEntry) -> ClassResponse:
+    return ClassResponse(id=row.id, name=row.name, teacher_id=row.teacher_id, teacher_login=row.teacher_login)
+
+
+async def _selected_classes(s: AsyncSession, token_payload: dict, class_id: int | None) -> tuple[ClassEntry, ...]:
+    if class_id is None:
+        return await _classes_for_user(s, token_payload)
+    return (await _get_accessible_class(s, token_payload, class_id),)
+
+
+def _attendance_from_fill(
+    current_date: date, class_id: int, fill_row: AttendanceFillBase | None
+) -> AttendanceResponse:
+    return AttendanceResponse(
+        date=current_date,
+        class_id=class_id,
+        is_filled=fill_row is not None,
+        total_students=fill_row.total_students if fill_row else 0,
+        present_count=fill_row.present_count if fill_row else 0,
+        absent_unexcused=fill_row.absent_unexcused if fill_row else [],
+        absent_excused=fill_row.absent_excused if fill_row else [],
     )
-    fill_row = (
-        s.query(AttendanceFillBase)
-        .filter(and_(AttendanceFillBase.class_id == class_id, AttendanceFillBase.date == current_date))
-        .first()
+
+
+async def _attendance_for_class(s: AsyncSession, current_date: date, class_id: int) -> AttendanceResponse:
+    fill_row = await s.scalar(
+        select(AttendanceFillBase).where(
+            and_(AttendanceFillBase.class_id == class_id, AttendanceFillBase.date == current_date)
+        )
     )
-    is_filled = fill_row is not None
-    total_students = fill_row.total_students if fill_row else 0
-    present_count = fill_row.present_count if fill_row else 0
-    unexcused = []
-    excused = []
-    for row in attendance_rows:
-        if row.status == AttendanceStatusEnum.unexcused:
-            unexcused.append({"fullName": row.absent_name})
-        elif row.status == AttendanceStatusEnum.excused:
-            excused.append(
-                {
-                    "fullName": row.absent_name,
-                    "reason": row.reason or "",
-                }
-            )
-    return {
-        "date": current_date.isoformat(),
-        "classId": class_id,
-        "isFilled": is_filled,
-        "totalStudents": total_students,
-        "presentCount": present_count,
-        "absentUnexcused": unexcused,
-        "absentExcused": excused,
-    }
-
-
-def _daily_stats_for_class(class_row: ClassBase, absent_rows: list[AttendanceBase]) -> dict:
-    class_id = class_row.id
-    absent_list = []
-    for row in absent_rows:
-        reason = row.reason or "Неуважительная причина"
-        absent_list.append(
-            {
-                "fullName": row.absent_name,
-                "classId": class_id,
-                "className": class_row.name,
-                "reason": reason,
-            }
+    return _attendance_from_fill(current_date, class_id, fill_row)
+
+
+def _daily_stats_for_class(
+    target_date: date, class_row: ClassEntry, absent_rows: list[AttendanceBase]
+) -> DailyStatisticsResponse:
+    absent_list = [
+        DailyStatisticsAbsentItem(
+            full_name=row.absent_name,
+            class_id=class_row.id,
+            class_name=class_row.name,
+            reason=row.reason or "Неуважительная причина",
         )
-    return {
-        "date": absent_rows[0].date.isoformat() if absent_rows else datetime.now().date().isoformat(),
-        "classId": class_id,
-        "className": class_row.name,
-        "totalAbsent": len(absent_list),
-        "absent": absent_list,
-    }
+        for row in absent_rows
+    ]
+    return DailyStatisticsResponse(
+        date=target_date,
+        class_id=class_row.id,
+        class_name=class_row.name,
+        total_absent=len(absent_list),
+        absent=absent_list,
+    )
 
 
-def _attendance_for_classes(s, current_date: date, class_rows: list[ClassBase]) -> list[dict]:
+async def _attendance_for_classes(
+    s: AsyncSession, current_date: date, class_rows: tuple[ClassEntry, ...]
+) -> list[AttendanceResponse]:
     if not class_rows:
         return []
-    class_ids = [row.id for row in class_rows]
-    attendance_rows = (
-        s.query(AttendanceBase)
-        .filter(and_(AttendanceBase.date == current_date, AttendanceBase.class_id.in_(class_ids)))
-        .all()
-    )
     fill_rows = (
-        s.query(AttendanceFillBase)
-        .filter(and_(AttendanceFillBase.date == current_date, AttendanceFillBase.class_id.in_(class_ids)))
-        .all()
-    )
-    fills_by_class = {row.class_id: row for row in fill_rows}
-    attendance_by_class = defaultdict(list)
-    for row in attendance_rows:
-        attendance_by_class[row.class_id].append(row)
-
-    result = []
-    for class_row in class_rows:
-        rows = attendance_by_class.get(class_row.id, [])
-        fill_row = fills_by_class.get(class_row.id)
-        is_filled = fill_row is not None
-        total_students = fill_row.total_students if fill_row else 0
-        present_count = fill_row.present_count if fill_row else 0
-        unexcused = []
-        excused = []
-        for row in rows:
-            if row.status == AttendanceStatusEnum.unexcused:
-                unexcused.append({"fullName": row.absent_name})
-            elif row.status == AttendanceStatusEnum.excused:
-                excused.append({"fullName": row.absent_name, "reason": row.reason or ""})
-        result.append(
-            {
-                "date": current_date.isoformat(),
-                "classId": class_row.id,
-                "isFilled": is_filled,
-                "totalStudents": total_students,
-                "presentCount": present_count,
-                "absentUnexcused": unexcused,
-                "absentExcused": excused,
-            }
+        await s.scalars(
+            select(AttendanceFillBase).where(
+                and_(
+                    AttendanceFillBase.date == current_date,
+                    AttendanceFillBase.class_id.in_([row.id for row in class_rows]),
+                )
+            )
         )
-    return result
-
-
-def _cleanup_old_history(s) -> None:
-    cutoff_date = datetime.now().date() - timedelta(days=HISTORY_RETENTION_DAYS - 1)
-    s.query(AttendanceBase).filter(AttendanceBase.date < cutoff_date).delete()
-    s.query(AttendanceFillBase).filter(AttendanceFillBase.date < cutoff_date).delete()
+    ).all()
+    fills_by_class = {row.class_id: row for row in fill_rows}
+    return [_attendance_from_fill(current_date, row.id, fills_by_class.get(row.id)) for row in class_rows]
 
 
-def _resolve_daily_stats_blocks(s, token_payload: dict, target_date: date, class_id: int | None) -> list[dict]:
-    if class_id is None:
-        if token_payload["role"] == RoleEnum.admin.value:
-            class_rows = s.query(ClassBase).order_by(ClassBase.id.asc()).all()
-        else:
-            class_rows = (
-                s.query(ClassBase)
-                .filter(ClassBase.teacher_id == int(token_payload["sub"]))
-                .order_by(ClassBase.id.asc())
-                .all()
-            )
-        if not class_rows:
-            return []
-        class_ids = [row.id for row in class_rows]
-        absent_rows = (
-            s.query(AttendanceBase)
-            .filter(
+async def _daily_stats_blocks(
+    s: AsyncSession, target_date: date, class_rows: tuple[ClassEntry, ...]
+) -> list[DailyStatisticsResponse]:
+    if not class_rows:
+        return []
+    absent_rows = (
+        await s.scalars(
+            select(AttendanceBase).where(
                 and_(
                     AttendanceBase.date == target_date,
-                    AttendanceBase.class_id.in_(class_ids),
+                    AttendanceBase.class_id.in_([row.id for row in class_rows]),
                 )
             )
-            .all()
         )
-        grouped_absent = defaultdict(list)
-        for row in absent_rows:
-            grouped_absent[row.class_id].append(row)
-        blocks = []
-        for row in class_rows:
-            block = _daily_stats_for_class(row, grouped_absent.get(row.id, []))
-            block["date"] = target_date.isoformat()
-            blocks.append(block)
-        return blocks
+    ).all()
+    grouped_absent = defaultdict(list)
+    for row in absent_rows:
+        grouped_absent[row.class_id].append(row)
+    return [_daily_stats_for_class(target_date, row, grouped_absent.get(row.id, [])) for row in class_rows]
 
-    resolved_class_id = _resolve_class_for_user(token_payload, class_id)
-    class_row = s.query(ClassBase).filter(ClassBase.id == resolved_class_id).first()
-    if not class_row:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-    if token_payload["role"] == RoleEnum.teacher.value and class_row.teacher_id != int(token_payload["sub"]):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-    absent_rows = (
-        s.query(AttendanceBase)
-        .filter(
-            and_(
-                AttendanceBase.class_id == resolved_class_id,
-                AttendanceBase.date == target_date,
+
+async def _fill_etag(s: AsyncSession, scope: str, target_date: date, class_rows: tuple[ClassEntry, ...]) -> str:
+    # Every save bumps its fill row's version, and deletions change the count or the
+    # class directory, so (count, sum of versions) changes whenever the payload can.
+    class_ids = [row.id for row in class_rows]
+    count, version_sum = (
+        await s.execute(
+            select(func.count(), func.coalesce(func.sum(AttendanceFillBase.version), 0)).where(
+                and_(AttendanceFillBase.date == target_date, AttendanceFillBase.class_id.in_(class_ids))
             )
         )
-        .all()
-    )
-    block = _daily_stats_for_class(class_row, absent_rows)
-    block["date"] = target_date.isoformat()
-    return [block]
+    ).one()
+    snapshot = await directory.snapshot(s)
+    return make_etag(scope, target_date.isoformat(), snapshot.version, class_ids, count, version_sum)
 
 
 @router.post("/auth/login")
-def login(credentials: LoginRequest):
-    with session() as s:
-        user = s.query(UserBase).filter(UserBase.login == credentials.login).first()
-        if not user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+async def login(credentials: LoginRequest, s: SessionDep):
+    user = await s.scalar(select(UserBase).where(UserBase.login == credentials.login))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    try:
+        password_ok = await hasher.check(credentials.password, user.password)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if not password_ok:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if needs_rehash(user.password):
         try:
-            password_ok = bcrypt.checkpw(credentials.password.encode("utf-8"), user.password.encode("utf-8"))
-        except ValueError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        if not password_ok:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        role = _role_value(user.role)
-        access_token = create_jwt({"sub": str(user.id), "role": role}, timedelta(days=7))
-        return {"accessToken": access_token, "role": role, "userId": user.id}
-
-
-@router.get("/users")
-def get_users(request: Request):
+            user.password = await hasher.hash(credentials.password)
+        except PasswordHasherBusy:
+            # Upgrading the hash is best-effort; the next login will try again.
+            pass
+    role = _role_value(user.role)
+    access_token = create_jwt({"sub": str(user.id), "role": role}, timedelta(days=7))
+    return {"accessToken": access_token, "role": role, "userId": user.id}
+
+
+def _user_response(user: UserBase, snapshot: DirectorySnapshot) -> UserResponse:
+    owned_classes = snapshot.for_teacher(user.id)
+    return UserResponse(
+        id=user.id,
+        login=user.login,
+        role=_role_value(user.role),
+        class_id=owned_classes[-1].id if owned_classes else None,
+        promoted_by=user.promoted_by,
+    )
+
+
+@router.get("/users", response_model=list[UserResponse] | UserPage)
+async def get_users(
+    request: Request,
+    s: SessionDep,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
+    after: int | None = None,
+    role: Literal["admin", "teacher"] | None = None,
+    loginPrefix: str | None = None,
+):
     payload = _get_token_payload(request)
     _require_role(payload, {RoleEnum.admin.value})
-    with session() as s:
-        users = s.query(UserBase).order_by(UserBase.id.asc()).all()
-        class_rows = s.query(ClassBase.teacher_id, ClassBase.id).all()
-        class_map = {teacher_id: class_id for teacher_id, class_id in class_rows}
-        return [
-            {
-                "id": user.id,
-                "login": user.login,
-                "role": _role_value(user.role),
-                "classId": class_map.get(user.id),
-                "promotedBy": user.promoted_by,
-            }
-            for user in users
-        ]
+    filters = []
+    if role is not None:
+        filters.append(UserBase.role == RoleEnum(role))
+    if loginPrefix:
+        filters.append(UserBase.login.istartswith(loginPrefix, autoescape=True))
+    stmt = select(UserBase).where(*filters).order_by(UserBase.id.asc())
+    snapshot = await directory.snapshot(s)
+    # Without limit/after the full list is returned, as before pagination existed.
+    if limit is None and after is None:
+        return [_user_response(user, snapshot) for user in (await s.scalars(stmt)).all()]
+    limit = limit or PAGE_DEFAULT_LIMIT
+    if after is not None:
+        stmt = stmt.where(UserBase.id > after)
+    users = (await s.scalars(stmt.limit(limit + 1))).all()
+    total = await s.scalar(select(func.count()).select_from(UserBase).where(*filters))
+    return UserPage(
+        items=[_user_response(user, snapshot) for user in users[:limit]],
+        total=total,
+        next_cursor=users[limit - 1].id if len(users) > limit else None,
+    )
 
 
 @router.post("/users")
-def register_teacher(request: Request):
+async def register_teacher(request: Request):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
     raise HTTPException(status_code=status.HTTP_410_GONE, detail="Teacher registration is disabled")
 
 
 @router.patch("/users/{id}/credentials")
-def update_credentials(id: int, request: Request, payload: UpdateCredentialsRequest):
+async def update_credentials(id: int, request: Request, payload: UpdateCredentialsRequest, s: SessionDep):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
     if payload.login is None and payload.password is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update fields provided")
-    with session() as s:
-        teacher = s.query(UserBase).filter(and_(UserBase.id == id, UserBase.role == RoleEnum.teacher)).first()
-        if not teacher:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Teacher not found")
-        if payload.login is not None:
-            teacher.login = payload.login
-        if payload.password is not None:
-            teacher.password = bcrypt.hashpw(payload.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        try:
-            s.commit()
-        except IntegrityError:
-            s.rollback()
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Login already exists")
-        return {"message": "Updated"}
+    teacher = await s.scalar(select(UserBase).where(and_(UserBase.id == id, UserBase.role == RoleEnum.teacher)))
+    if not teacher:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Teacher not found")
+    if payload.login is not None:
+        teacher.login = payload.login
+        await mark_changed(s)
+    if payload.password is not None:
+        teacher.password = await hasher.hash(payload.password)
+    try:
+        await s.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Login already exists")
+    return {"message": "Updated"}
 
 
 @router.patch("/profile/credentials")
-def update_my_credentials(request: Request, payload: UpdateCredentialsRequest):
+async def update_my_credentials(request: Request, payload: UpdateCredentialsRequest, s: SessionDep):
     token_payload = _get_token_payload(request)
     if payload.login is None and payload.password is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update fields provided")
-    with session() as s:
-        current_user = _get_current_user(s, token_payload)
-        if payload.login is not None:
-            current_user.login = payload.login
-        if payload.password is not None:
-            current_user.password = bcrypt.hashpw(payload.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        try:
-            s.commit()
-        except IntegrityError:
-            s.rollback()
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Login already exists")
-        return {"message": "Updated"}
+    current_user = await _get_current_user(s, token_payload)
+    if payload.login is not None:
+        current_user.login = payload.login
+        await mark_changed(s)
+    if payload.password is not None:
+        current_user.password = await hasher.hash(payload.password)
+    try:
+        await s.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Login already exists")
+    return {"message": "Updated"}
 
 
 @router.patch("/users/{id}/role")
-def update_user_role(id: int, request: Request, payload: UpdateRoleRequest):
+async def update_user_role(id: int, request: Request, payload: UpdateRoleRequest, s: SessionDep):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
     if payload.role not in {RoleEnum.teacher.value, RoleEnum.admin.value}:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid role")
-    with session() as s:
-        actor = _get_current_user(s, token_payload)
-        target = s.query(UserBase).filter(UserBase.id == id).first()
-        if not target:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-        if actor.promoted_by == target.id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
-        new_role = RoleEnum(payload.role)
-        target.role = new_role
-        if new_role == RoleEnum.admin:
-            target.promoted_by = actor.id
-        else:
-            target.promoted_by = None
-        s.commit()
-        return {"message": "Updated"}
+    actor = await _get_current_user(s, token_payload)
+    target = await s.scalar(select(UserBase).where(UserBase.id == id))
+    if not target:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    if actor.promoted_by == target.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
-@router.get("/classes")
-def get_classes(request: Request):
+    new_role = RoleEnum(payload.role)
+    target.role = new_role
+    if new_role == RoleEnum.admin:
+        target.promoted_by = actor.id
+    else:
+        target.promoted_by = None
+    return {"message": "Updated"}
+
+
+@router.get("/classes", response_model=list[ClassResponse] | ClassPage)
+async def get_classes(
+    request: Request,
+    s: SessionDep,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
+    after: int | None = None,
+    namePrefix: str | None = None,
+):
     payload = _get_token_payload(request)
-    with session() as s:
-        if payload["role"] == RoleEnum.admin.value:
-            class_rows = s.query(ClassBase).all()
-        else:
-            class_rows = s.query(ClassBase).filter(ClassBase.teacher_id == int(payload["sub"])).all()
-        return [{"id": row.id, "name": row.name, "teacherId": row.teacher_id} for row in class_rows]
+    class_rows = await _classes_for_user(s, payload)
+    if namePrefix:
+        prefix = namePrefix.lower()
+        class_rows = tuple(row for row in class_rows if row.name.lower().startswith(prefix))
+    if limit is None and after is None:
+        return [_class_response(row) for row in class_rows]
+    # The directory snapshot is ordered by id, so the cursor is a binary search away.
+    limit = limit or PAGE_DEFAULT_LIMIT
+    start = 0 if after is None else bisect_right(class_rows, after, key=lambda row: row.id)
+    page = class_rows[start : start + limit]
+    return ClassPage(
+        items=[_class_response(row) for row in page],
+        total=len(class_rows),
+        next_cursor=page[-1].id if start + limit < len(class_rows) else None,
+    )
 
 
 @router.post("/classes", status_code=status.HTTP_201_CREATED)
-def create_class(request: Request, payload: CreateClassRequest):
+async def create_class(request: Request, payload: CreateClassRequest, s: SessionDep):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
-    with session() as s:
-        class_login = payload.name.strip()
-        if not class_login:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Class name is required")
-        if not payload.password:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password is required")
-        hashed_password = bcrypt.hashpw(payload.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        class_user = UserBase(login=class_login, password=hashed_password, role=RoleEnum.teacher)
-        class_row = ClassBase(name=class_login, teacher_id=None)
-        try:
-            s.add(class_user)
-            s.flush()
-            class_row.teacher_id = class_user.id
-            s.add(class_row)
-            s.commit()
-        except IntegrityError:
-            s.rollback()
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Класс с таким именем уже существует")
-        return {"message": "Class created"}
+    class_login = payload.name.strip()
+    if not class_login:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Class name is required")
+    if not payload.password:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password is required")
+    hashed_password = await hasher.hash(payload.password)
+    class_user = UserBase(login=class_login, password=hashed_password, role=RoleEnum.teacher)
+    class_row = ClassBase(name=class_login, teacher_id=None)
+    try:
+        s.add(class_user)
+        await s.flush()
+        class_row.teacher_id = class_user.id
+        s.add(class_row)
+        await s.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Класс с таким именем уже существует")
+    await mark_changed(s)
+    return {"message": "Class created"}
+
+
+@router.post("/classes/import", response_model=ClassImportResponse)
+async def import_classes(request: Request, file: UploadFile, s: SessionDep):
+    token_payload = _get_token_payload(request)
+    _require_role(token_payload, {RoleEnum.admin.value})
+    try:
+        rows = parse_class_csv(await file.read())
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV has no classes")
+
+    taken = await taken_names(s, [row.name for row in rows if not row.error])
+    results = {}
+    pending = []
+    seen_names = set()
+    for row in rows:
+        if row.error:
+            results[row.line] = (status.HTTP_400_BAD_REQUEST, row.error)
+            continue
+        if row.name in seen_names:
+            results[row.line] = (status.HTTP_400_BAD_REQUEST, "Duplicate class name in file")
+        elif row.name in taken:
+            results[row.line] = (status.HTTP_409_CONFLICT, "Класс с таким именем уже существует")
+        else:
+            pending.append(row)
+        seen_names.add(row.name)
+
+    hashed_passwords = await hasher.hash_many([row.password for row in pending])
+    created = await insert_classes(s, [(row.name, hashed) for row, hashed in zip(pending, hashed_passwords)])
+    for row in pending:
+        if row.name in created:
+            results[row.line] = (status.HTTP_201_CREATED, "Class created")
+        else:
+            results[row.line] = (status.HTTP_409_CONFLICT, "Класс с таким именем уже существует")
+    if created:
+        await mark_changed(s)
+    return ClassImportResponse(
+        created=len(created),
+        results=[
+            ClassImportResult(line=row.line, name=row.name, status=results[row.line][0], message=results[row.line][1])
+            for row in rows
+        ],
+    )
 
 
 @router.patch("/classes/{id}/credentials")
-def update_class_credentials(id: int, request: Request, payload: UpdateClassCredentialsRequest):
+async def update_class_credentials(id: int, request: Request, payload: UpdateClassCredentialsRequest, s: SessionDep):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
     if payload.login is None and payload.password is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update fields provided")
-    with session() as s:
-        class_row = s.query(ClassBase).filter(ClassBase.id == id).first()
-        if not class_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-        class_user = (
-            s.query(UserBase)
-            .filter(and_(UserBase.id == class_row.teacher_id, UserBase.role == RoleEnum.teacher))
-            .first()
-        )
-        if not class_user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class account not found")
-        if payload.login is not None:
-            new_login = payload.login.strip()
-            if not new_login:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Login cannot be empty")
-            class_user.login = new_login
-            class_row.name = new_login
-        if payload.password is not None:
-            if not payload.password:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password cannot be empty")
-            class_user.password = bcrypt.hashpw(payload.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        try:
-            s.commit()
-        except IntegrityError:
-            s.rollback()
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Class name or login already exists")
-        return {"message": "Updated"}
+    class_row = await s.scalar(select(ClassBase).where(ClassBase.id == id))
+    if not class_row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
+    class_user = await s.scalar(
+        select(UserBase).where(and_(UserBase.id == class_row.teacher_id, UserBase.role == RoleEnum.teacher))
+    )
+    if not class_user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class account not found")
+    if payload.login is not None:
+        new_login = payload.login.strip()
+        if not new_login:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Login cannot be empty")
+        class_user.login = new_login
+        class_row.name = new_login
+        await mark_changed(s)
+    if payload.password is not None:
+        if not payload.password:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password cannot be empty")
+        class_user.password = await hasher.hash(payload.password)
+    try:
+        await s.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Class name or login already exists")
+    return {"message": "Updated"}
 
 
 @router.delete("/classes/{id}")
-def delete_class(id: int, request: Request):
+async def delete_class(id: int, request: Request, s: SessionDep):
     token_payload = _get_token_payload(request)
     _require_role(token_payload, {RoleEnum.admin.value})
-    with session() as s:
-        class_row = s.query(ClassBase).filter(ClassBase.id == id).first()
-        if not class_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-        class_user_id = class_row.teacher_id
-        s.query(AttendanceBase).filter(AttendanceBase.class_id == id).delete()
-        s.query(AttendanceFillBase).filter(AttendanceFillBase.class_id == id).delete()
-        s.query(StudentBase).filter(StudentBase.class_id == id).delete()
-        s.delete(class_row)
-        if class_user_id is not None:
-            class_user = (
-                s.query(UserBase)
-                .filter(and_(UserBase.id == class_user_id, UserBase.role == RoleEnum.teacher))
-                .first()
-            )
-            if class_user:
-                s.delete(class_user)
-        s.commit()
-        return {"message": "Deleted"}
+    class_row = await s.scalar(select(ClassBase).where(ClassBase.id == id))
+    if not class_row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
+    class_user_id = class_row.teacher_id
+    await s.execute(delete(AttendanceBase).where(AttendanceBase.class_id == id))
+    await s.execute(delete(AttendanceFillBase).where(AttendanceFillBase.class_id == id))
+    await s.execute(delete(AttendanceWeeklyBase).where(AttendanceWeeklyBase.class_id == id))
+    await s.execute(delete(StudentBase).where(StudentBase.class_id == id))
+    await s.delete(class_row)
+    if class_user_id is not None:
+        class_user = await s.scalar(
+            select(UserBase).where(and_(UserBase.id == class_user_id, UserBase.role == RoleEnum.teacher))
+        )
+        if class_user:
+            await s.delete(class_user)
+    await mark_changed(s)
+    return {"message": "Deleted"}
 
 
-@router.get("/attendance")
-def get_attendance(date: date, request: Request, classId: int | None = None):
+@router.get("/attendance", response_model=list[AttendanceResponse] | AttendanceResponse)
+async def get_attendance(
+    date: date, request: Request, response: Response, s: SessionDep, classId: int | None = None
+):
     token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        if classId is None and token_payload["role"] == RoleEnum.admin.value:
-            class_rows = s.query(ClassBase).order_by(ClassBase.id.asc()).all()
-            return _attendance_for_classes(s, date, class_rows)
-
-        resolved_class_id = _resolve_class_for_user(token_payload, classId)
-        class_row = s.query(ClassBase).filter(ClassBase.id == resolved_class_id).first()
-        if not class_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-        if token_payload["role"] == RoleEnum.teacher.value and class_row.teacher_id != int(token_payload["sub"]):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-        return _attendance_for_class(s, date, resolved_class_id)
+    all_classes = classId is None and token_payload["role"] == RoleEnum.admin.value
+    if all_classes:
+        class_rows = (await directory.snapshot(s)).classes
+    else:
+        class_rows = (await _get_accessible_class(s, token_payload, classId),)
+    etag = await _fill_etag(s, "attendance", date, class_rows)
+    if cached := not_modified(request, response, etag):
+        return cached
+    if all_classes:
+        return await _attendance_for_classes(s, date, class_rows)
+    return await _attendance_for_class(s, date, class_rows[0].id)
+
+
+def _normalize_attendance_payload(payload: AttendanceRequest) -> tuple[list[str], list[dict]]:
+    if payload.total_students < 0 or payload.present_count < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid totals")
+    if payload.present_count > payload.total_students:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Present count exceeds total")
+    absent_unexcused = []
+    for name in payload.absent_unexcused:
+        normalized_name = _normalize_absent_name(name)
+        if normalized_name:
+            absent_unexcused.append(normalized_name)
+
+    absent_excused = []
+    for item in payload.absent_excused:
+        normalized_name = _normalize_absent_name(item.full_name)
+        if not normalized_name:
+            continue
+        absent_excused.append({"fullName": normalized_name, "reason": item.reason.strip()})
+    if any(not item["reason"] for item in absent_excused):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reason is required for excused absence")
+
+    normalized_unexcused = {name.casefold() for name in absent_unexcused}
+    normalized_excused = {item["fullName"].casefold() for item in absent_excused}
+    if len(normalized_unexcused) != len(absent_unexcused) or len(normalized_excused) != len(absent_excused):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate absent fullName")
+    if normalized_unexcused & normalized_excused:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate absent fullName")
+
+    absent_count = len(absent_unexcused) + len(absent_excused)
+    expected_absent = payload.total_students - payload.present_count
+    if absent_count != expected_absent:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Absent count must match totalStudents - presentCount",
+        )
+    return absent_unexcused, absent_excused
+
+
+@dataclass(frozen=True)
+class AttendanceSave:
+    date: date
+    class_id: int
+    total_students: int
+    present_count: int
+    absent_unexcused: list[str]
+    absent_excused: list[dict]
+
+
+async def _save_attendance_batch(s: AsyncSession, saves: list[AttendanceSave]) -> None:
+    # Five statements regardless of how many classes, days and names are submitted:
+    # lock the weeks, prune, upsert absences, upsert fills, refresh the weekly rollups;
+    # plus one pg_notify per saved date for the event stream.
+    # Each (date, class_id) may appear at most once in saves.
+    if not saves:
+        return
+    absent_rows = []
+    for save in saves:
+        absent_rows += [
+            {
+                "date": save.date,
+                "class_id": save.class_id,
+                "absent_name": name,
+                "status": AttendanceStatusEnum.unexcused,
+                "reason": None,
+            }
+            for name in save.absent_unexcused
+        ]
+        absent_rows += [
+            {
+                "date": save.date,
+                "class_id": save.class_id,
+                "absent_name": item["fullName"],
+                "status": AttendanceStatusEnum.excused,
+                "reason": item["reason"],
+            }
+            for item in save.absent_excused
+        ]
+    days = [(save.class_id, save.date) for save in saves]
+
+    await lock_weeks(s, days)
+
+    # The absences travel as one array per column and are unnested server-side, so a large
+    # batch binds five parameters instead of several per name (asyncpg allows 32767).
+    absent = func.unnest(
+        bindparam("absent_class_ids", [row["class_id"] for row in absent_rows], type_=ARRAY(Integer)),
+        bindparam("absent_dates", [row["date"] for row in absent_rows], type_=ARRAY(Date)),
+        bindparam("absent_names", [row["absent_name"] for row in absent_rows], type_=ARRAY(String)),
+        bindparam("absent_statuses", [row["status"].name for row in absent_rows], type_=ARRAY(String)),
+        bindparam("absent_reasons", [row["reason"] for row in absent_rows], type_=ARRAY(String)),
+    ).table_valued(
+        column("class_id", Integer),
+        column("date", Date),
+        column("absent_name", String),
+        column("status", String),
+        column("reason", String),
+    ).render_derived(name="absent")
+    absent_status = cast(absent.c.status, AttendanceBase.status.type)
+
+    await s.execute(
+        delete(AttendanceBase).where(
+            tuple_(AttendanceBase.class_id, AttendanceBase.date).in_(days),
+            ~exists().where(
+                absent.c.class_id == AttendanceBase.class_id,
+                absent.c.date == AttendanceBase.date,
+                absent.c.absent_name == AttendanceBase.absent_name,
+                absent_status == AttendanceBase.status,
+            ),
+        )
+    )
 
+    if absent_rows:
+        absent_stmt = pg_insert(AttendanceBase).from_select(
+            ["class_id", "date", "absent_name", "status", "reason"],
+            select(absent.c.class_id, absent.c.date, absent.c.absent_name, absent_status, absent.c.reason),
+        )
+        absent_stmt = absent_stmt.on_conflict_do_update(
+            constraint="uq_attendance",
+            set_={"reason": absent_stmt.excluded.reason},
+        )
+        await s.execute(absent_stmt)
 
-@router.put("/attendance")
-def put_attendance(date: date, request: Request, payload: AttendanceRequest):
-    token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        resolved_class_id = _resolve_class_for_user(token_payload, payload.class_id)
-        class_row = s.query(ClassBase).filter(ClassBase.id == resolved_class_id).first()
-        if not class_row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
-        if token_payload["role"] == RoleEnum.teacher.value and class_row.teacher_id != int(token_payload["sub"]):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-        if payload.total_students < 0 or payload.present_count < 0:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid totals")
-        if payload.present_count > payload.total_students:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Present count exceeds total")
-        absent_unexcused = []
-        for name in payload.absent_unexcused:
-            normalized_name = _normalize_absent_name(name)
-            if normalized_name:
-                absent_unexcused.append(normalized_name)
-
-        absent_excused = []
-        for item in payload.absent_excused:
-            normalized_name = _normalize_absent_name(item.full_name)
-            if not normalized_name:
-                continue
-            absent_excused.append({"fullName": normalized_name, "reason": item.reason.strip()})
-        if any(not item["reason"] for item in absent_excused):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Reason is required for excused absence")
-
-        normalized_unexcused = {name.casefold() for name in absent_unexcused}
-        normalized_excused = {item["fullName"].casefold() for item in absent_excused}
-        if len(normalized_unexcused) != len(absent_unexcused) or len(normalized_excused) != len(absent_excused):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate absent fullName")
-        if normalized_unexcused & normalized_excused:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate absent fullName")
-
-        absent_count = len(absent_unexcused) + len(absent_excused)
-        expected_absent = payload.total_students - payload.present_count
-        if absent_count != expected_absent:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Absent count must match totalStudents - presentCount",
-            )
+    filled_at = datetime.now()
+    fill_stmt = pg_insert(AttendanceFillBase).values(
+        [
+            {
+                "date": save.date,
+                "class_id": save.class_id,
+                "total_students": save.total_students,
+                "present_count": save.present_count,
+                "absent_unexcused": [{"fullName": name} for name in save.absent_unexcused],
+                "absent_excused": save.absent_excused,
+                "filled_at": filled_at,
+            }
+            for save in saves
+        ]
+    )
+    fill_stmt = fill_stmt.on_conflict_do_update(
+        constraint="uq_attendance_fill",
+        set_={
+            "total_students": fill_stmt.excluded.total_students,
+            "present_count": fill_stmt.excluded.present_count,
+            "absent_unexcused": fill_stmt.excluded.absent_unexcused,
+            "absent_excused": fill_stmt.excluded.absent_excused,
+            "version": AttendanceFillBase.version + 1,
+            "filled_at": fill_stmt.excluded.filled_at,
+        },
+    )
+    await s.execute(fill_stmt)
+    await refresh_weeks(s, days)
+    await publish_fills(s, days)
+
+
+async def _save_attendance(
+    s: AsyncSession,
+    target_date: date,
+    class_id: int,
+    total_students: int,
+    present_count: int,
+    absent_unexcused: list[str],
+    absent_excused: list[dict],
+) -> None:
+    await _save_attendance_batch(
+        s, [AttendanceSave(target_date, class_id, total_students, present_count, absent_unexcused, absent_excused)]
+    )
 
-        current_absent = (
-            s.query(AttendanceBase)
-            .filter(and_(AttendanceBase.date == date, AttendanceBase.class_id == resolved_class_id))
-            .all()
-        )
-        current_unexcused = {row.absent_name for row in current_absent if row.status == AttendanceStatusEnum.unexcused}
-        current_excused = {row.absent_name: row for row in current_absent if row.status == AttendanceStatusEnum.excused}
-
-        new_unexcused = set(absent_unexcused)
-        new_excused_names = set(item["fullName"] for item in absent_excused)
-
-        # Add new unexcused
-        for name in absent_unexcused:
-            if name not in current_unexcused:
-                s.add(
-                    AttendanceBase(
-                        date=date,
-                        class_id=resolved_class_id,
-                        absent_name=name,
-                        status=AttendanceStatusEnum.unexcused,
-                    )
-                )
 
-        # Update or add excused
-        for item in absent_excused:
-            name = item["fullName"]
-            if name in current_excused:
-                current_excused[name].reason = item["reason"]
-            else:
-                s.add(
-                    AttendanceBase(
-                        date=date,
-                        class_id=resolved_class_id,
-                        absent_name=name,
-                        status=AttendanceStatusEnum.excused,
-                        reason=item["reason"],
-                    )
-                )
+async def _missing_class_ids(s: AsyncSession, class_ids: set[int]) -> set[int]:
+    # A failed save aborts the transaction; nothing was written before it, so roll back and look.
+    await s.rollback()
+    return class_ids - set(await s.scalars(select(ClassBase.id).where(ClassBase.id.in_(class_ids))))
 
-        to_delete = [
-            row for row in current_absent
-            if (row.status == AttendanceStatusEnum.unexcused and row.absent_name not in new_unexcused) or
-               (row.status == AttendanceStatusEnum.excused and row.absent_name not in new_excused_names)
-        ]
-        for row in to_delete:
-            s.delete(row)
 
-        existing_fill = (
-            s.query(AttendanceFillBase)
-            .filter(and_(AttendanceFillBase.date == date, AttendanceFillBase.class_id == resolved_class_id))
-            .first()
+@router.put("/attendance")
+async def put_attendance(date: date, request: Request, payload: AttendanceRequest, s: SessionDep):
+    token_payload = _get_token_payload(request)
+    class_row = await _get_accessible_class(s, token_payload, payload.class_id)
+    absent_unexcused, absent_excused = _normalize_attendance_payload(payload)
+    try:
+        await _save_attendance(
+            s,
+            date,
+            class_row.id,
+            payload.total_students,
+            payload.present_count,
+            absent_unexcused,
+            absent_excused,
         )
-        if not existing_fill:
-            s.add(
-                AttendanceFillBase(
-                    date=date,
-                    class_id=resolved_class_id,
-                    total_students=payload.total_students,
-                    present_count=payload.present_count,
+    except IntegrityError:
+        # The class may have been deleted by another worker before this worker's directory was invalidated.
+        if not await _missing_class_ids(s, {class_row.id}):
+            raise
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Class not found")
+    return {"message": "Saved"}
+
+
+@router.put("/attendance/batch", response_model=AttendanceBatchResponse)
+async def put_attendance_batch(request: Request, payload: AttendanceBatchRequest, s: SessionDep):
+    token_payload = _get_token_payload(request)
+    saves = []
+    results = []
+    saved_keys = set()
+    for index, item in enumerate(payload.items):
+        class_id = item.class_id
+        try:
+            class_row = await _get_accessible_class(s, token_payload, item.class_id)
+            class_id = class_row.id
+            if (item.date, class_id) in saved_keys:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate date and classId in batch"
+                )
+            absent_unexcused, absent_excused = _normalize_attendance_payload(item)
+        except HTTPException as exc:
+            results.append(
+                AttendanceBatchResult(
+                    index=index, date=item.date, class_id=class_id, status=exc.status_code, message=exc.detail
                 )
             )
-        else:
-            existing_fill.total_students = payload.total_students
-            existing_fill.present_count = payload.present_count
-            existing_fill.filled_at = datetime.now()
-        s.commit()
-        return {"message": "Saved"}
+            continue
+        saved_keys.add((item.date, class_id))
+        saves.append(
+            AttendanceSave(
+                item.date, class_id, item.total_students, item.present_count, absent_unexcused, absent_excused
+            )
+        )
+        results.append(
+            AttendanceBatchResult(index=index, date=item.date, class_id=class_id, status=200, message="Saved")
+        )
+    while True:
+        try:
+            await _save_attendance_batch(s, saves)
+            break
+        except IntegrityError:
+            # Classes deleted by another worker fail only their own items; the rest are saved again.
+            missing = await _missing_class_ids(s, {save.class_id for save in saves})
+            if not missing:
+                raise
+            saves = [save for save in saves if save.class_id not in missing]
+            results = [
+                result.model_copy(update={"status": status.HTTP_404_NOT_FOUND, "message": "Class not found"})
+                if result.status == 200 and result.class_id in missing
+                else result
+                for result in results
+            ]
+    return AttendanceBatchResponse(saved=len(saves), results=results)
+
+
+@router.get("/statistics/daily", response_model=list[DailyStatisticsResponse] | DailyStatisticsResponse)
+async def get_daily_statistics(
+    date: date, request: Request, response: Response, s: SessionDep, classId: int | None = None
+):
+    token_payload = _get_token_payload(request)
+    class_rows = await _selected_classes(s, token_payload, classId)
+    etag = await _fill_etag(s, "statistics/daily", date, class_rows)
+    if cached := not_modified(request, response, etag):
+        return cached
+    blocks = await _daily_stats_blocks(s, date, class_rows)
+    if classId is None:
+        return blocks
+    return blocks[0]
+
+
+def _weekly_stats_for_class(
+    class_row: ClassEntry, rollup: AttendanceWeeklyBase | None, start: date
+) -> WeeklyStatisticsResponse:
+    return WeeklyStatisticsResponse(
+        week_start=start,
+        week_end=start + timedelta(days=6),
+        class_id=class_row.id,
+        class_name=class_row.name,
+        days_filled=rollup.days_filled if rollup else 0,
+        total_students=rollup.total_students if rollup else 0,
+        present_count=rollup.present_count if rollup else 0,
+        absent_excused=rollup.absent_excused if rollup else 0,
+        absent_unexcused=rollup.absent_unexcused if rollup else 0,
+    )
 
 
-@router.get("/statistics/daily")
-def get_daily_statistics(date: date, request: Request, classId: int | None = None):
+@router.get("/statistics/weekly", response_model=list[WeeklyStatisticsResponse] | WeeklyStatisticsResponse)
+async def get_weekly_statistics(date: date, request: Request, s: SessionDep, classId: int | None = None):
     token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        blocks = _resolve_daily_stats_blocks(s, token_payload, date, classId)
-        if classId is None:
-            return blocks
-        return blocks[0]
+    class_rows = await _selected_classes(s, token_payload, classId)
+    start = week_start(date)
+    rollups = {}
+    if class_rows:
+        rollup_rows = (
+            await s.scalars(
+                select(AttendanceWeeklyBase).where(
+                    and_(
+                        AttendanceWeeklyBase.week_start == start,
+                        AttendanceWeeklyBase.class_id.in_([row.id for row in class_rows]),
+                    )
+                )
+            )
+        ).all()
+        rollups = {row.class_id: row for row in rollup_rows}
+    blocks = [_weekly_stats_for_class(row, rollups.get(row.id), start) for row in class_rows]
+    if classId is None:
+        return blocks
+    return blocks[0]
 
 
 @router.get("/statistics/daily/export")
-def export_daily_statistics_excel(date: date, request: Request, classId: int | None = None):
+async def export_daily_statistics_excel(date: date, request: Request, s: SessionDep, classId: int | None = None):
     token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        blocks = _resolve_daily_stats_blocks(s, token_payload, date, classId)
-
-    workbook = Workbook()
-    details_sheet = workbook.active
-    details_sheet.title = "Absent details"
-    details_sheet.append(["Date", "Class ID", "Class Name", "Full Name", "Reason"])
-
-    for block in blocks:
-        for item in block["absent"]:
-            details_sheet.append(
-                [
-                    block["date"],
-                    block["classId"],
-                    block["className"],
-                    item["fullName"],
-                    item["reason"],
-                ]
-            )
+    class_rows = await _selected_classes(s, token_payload, classId)
 
-    if details_sheet.max_row == 1:
-        details_sheet.append([date.isoformat(), "-", "-", "No absences", "-"])
-
-    summary_sheet = workbook.create_sheet("Summary")
-    summary_sheet.append(["Date", "Class ID", "Class Name", "Total absent"])
-    total_absent_all = 0
-    for block in blocks:
-        summary_sheet.append([block["date"], block["classId"], block["className"], block["totalAbsent"]])
-        total_absent_all += block["totalAbsent"]
-    summary_sheet.append([date.isoformat(), "-", "TOTAL", total_absent_all])
-
-    details_sheet.column_dimensions["A"].width = 14
-    details_sheet.column_dimensions["B"].width = 10
-    details_sheet.column_dimensions["C"].width = 24
-    details_sheet.column_dimensions["D"].width = 28
-    details_sheet.column_dimensions["E"].width = 28
-    summary_sheet.column_dimensions["A"].width = 14
-    summary_sheet.column_dimensions["B"].width = 10
-    summary_sheet.column_dimensions["C"].width = 24
-    summary_sheet.column_dimensions["D"].width = 14
-
-    output = BytesIO()
-    workbook.save(output)
+    output = await build_xlsx(iter_absent_rows(s, class_rows, date, date), class_rows, date.isoformat())
+    content_length = output.seek(0, 2)
     output.seek(0)
     class_suffix = f"_class_{classId}" if classId is not None else "_all_classes"
     filename = f"attendance_statistics_{date.isoformat()}{class_suffix}.xlsx"
 
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return StreamingResponse(
+        iter_file(output),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(content_length),
+        },
     )
 
 
 @router.get("/statistics/daily/export/csv")
-def export_daily_statistics_csv(date: date, request: Request, classId: int | None = None):
+async def export_daily_statistics_csv(date: date, request: Request, s: SessionDep, classId: int | None = None):
     token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        blocks = _resolve_daily_stats_blocks(s, token_payload, date, classId)
-
-    csv_buffer = StringIO()
-    writer = csv.writer(csv_buffer)
-    writer.writerow(["Date", "Class ID", "Class Name", "Full Name", "Reason"])
-
-    has_absences = False
-    for block in blocks:
-        for item in block["absent"]:
-            writer.writerow([block["date"], block["classId"], block["className"], item["fullName"], item["reason"]])
-            has_absences = True
-
-    if not has_absences:
-        writer.writerow([date.isoformat(), "-", "-", "No absences", "-"])
-
-    writer.writerow([])
-    writer.writerow(["Summary"])
-    writer.writerow(["Date", "Class ID", "Class Name", "Total absent"])
-    total_absent_all = 0
-    for block in blocks:
-        writer.writerow([block["date"], block["classId"], block["className"], block["totalAbsent"]])
-        total_absent_all += block["totalAbsent"]
-    writer.writerow([date.isoformat(), "-", "TOTAL", total_absent_all])
+    class_rows = await _selected_classes(s, token_payload, classId)
 
     class_suffix = f"_class_{classId}" if classId is not None else "_all_classes"
     filename = f"attendance_statistics_{date.isoformat()}{class_suffix}.csv"
 
-    return Response(
-        content=csv_buffer.getvalue().encode("utf-8-sig"),
-        media_type="text/csv; charset=utf-8",
+    return StreamingResponse(
+        stream_csv(class_rows, date, date, date.isoformat()),
+        media_type=CSV_MEDIA_TYPE,
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
-@router.get("/attendance/unfilled-classes")
-def get_unfilled_classes(date: date, request: Request):
+@router.get("/statistics/export")
+async def export_statistics_range(
+    request: Request,
+    s: SessionDep,
+    date_from: Annotated[date, Query(alias="from")],
+    date_to: Annotated[date, Query(alias="to")],
+    classId: int | None = None,
+    format: Literal["xlsx", "csv"] = "xlsx",
+):
     token_payload = _get_token_payload(request)
-    with session() as s:
-        _cleanup_old_history(s)
-        s.commit()
-        if token_payload["role"] == RoleEnum.admin.value:
-            class_rows = s.query(ClassBase).order_by(ClassBase.id.asc()).all()
-        else:
-            class_rows = (
-                s.query(ClassBase)
-                .filter(ClassBase.teacher_id == int(token_payload["sub"]))
-                .order_by(ClassBase.id.asc())
-                .all()
-            )
-        filled_class_ids = {
-            class_id
-            for (class_id,) in s.query(AttendanceFillBase.class_id).filter(AttendanceFillBase.date == date).all()
-        }
-        teacher_ids = {row.teacher_id for row in class_rows}
-        teacher_rows = s.query(UserBase.id, UserBase.login).filter(UserBase.id.in_(teacher_ids)).all() if teacher_ids else []
-        teacher_map = {teacher_id: login for teacher_id, login in teacher_rows}
-        return [
-            {
-                "id": row.id,
-                "name": row.name,
-                "teacherId": row.teacher_id,
-                "teacherLogin": teacher_map.get(row.teacher_id),
-            }
-            for row in class_rows
-            if row.id not in filled_class_ids
-        ]
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from must not be after to")
+    if (date_to - date_from).days >= EXPORT_MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Export range cannot exceed {EXPORT_MAX_RANGE_DAYS} days",
+        )
+    class_rows = await _selected_classes(s, token_payload, classId)
+
+    period = f"{date_from.isoformat()}..{date_to.isoformat()}"
+    class_suffix = f"_class_{classId}" if classId is not None else "_all_classes"
+    filename = f"attendance_statistics_{date_from.isoformat()}_{date_to.isoformat()}{class_suffix}.{format}"
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "csv":
+        return StreamingResponse(
+            stream_csv(class_rows, date_from, date_to, period), media_type=CSV_MEDIA_TYPE, headers=disposition
+        )
+    output = await build_xlsx(iter_absent_rows(s, class_rows, date_from, date_to), class_rows, period)
+    content_length = output.seek(0, 2)
+    output.seek(0)
+    return StreamingResponse(
+        iter_file(output),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={**disposition, "Content-Length": str(content_length)},
+    )
+
+
+@router.get("/attendance/unfilled-classes", response_model=list[UnfilledClassResponse])
+async def get_unfilled_classes(date: date, request: Request, response: Response, s: SessionDep):
+    token_payload = _get_token_payload(request)
+    class_rows = await _classes_for_user(s, token_payload)
+    etag = await _fill_etag(s, "attendance/unfilled-classes", date, class_rows)
+    if cached := not_modified(request, response, etag):
+        return cached
+    filled_class_ids = set(
+        (await s.scalars(select(AttendanceFillBase.class_id).where(AttendanceFillBase.date == date))).all()
+    )
+    return [
+        UnfilledClassResponse(
+            id=row.id, name=row.name, teacher_id=row.teacher_id, teacher_login=row.teacher_login
+        )
+        for row in class_rows
+        if row.id not in filled_class_ids
+    ]
+
+
+@router.get("/events/attendance")
+async def attendance_events(request: Request, s: SessionDep):
+    token_payload = _get_token_payload(request)
+    class_ids = None
+    if token_payload["role"] != RoleEnum.admin.value:
+        class_ids = frozenset(row.id for row in await _classes_for_user(s, token_payload))
+    # The session is released when this handler returns; the stream itself holds no connection.
+    return StreamingResponse(
+        broker.stream(class_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
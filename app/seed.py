@@ -0,0 +1,256 @@
+import argparse
+import io
+import json
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import execute_values
+from sqlalchemy import Engine
+
+from db import engine
+from partitions import PARTITIONED_TABLES, ensure_partitions, is_partitioned
+from passwords import hash_password_sync
+from weekly_stats import backfill
+
+logger = logging.getLogger(__name__)
+
+GRADES = range(1, 12)
+LETTERS = "АБВГ"
+MALE_SURNAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+    "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+    "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьёв",
+    "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьёв", "Сергеев", "Кузьмин", "Фролов", "Беляев",
+]
+MALE_NAMES = [
+    "Александр", "Максим", "Михаил", "Артём", "Даниил", "Иван", "Дмитрий", "Кирилл", "Андрей", "Егор",
+    "Никита", "Илья", "Алексей", "Матвей", "Тимофей", "Роман", "Владимир", "Ярослав", "Фёдор", "Лев",
+]
+FEMALE_NAMES = [
+    "Анна", "Мария", "Алиса", "Виктория", "Полина", "Елизавета", "Екатерина", "Софья", "Дарья", "Варвара",
+    "Александра", "Ксения", "Вероника", "Арина", "Василиса", "Ульяна", "Милана", "Ева", "Таисия", "Кира",
+]
+# Weights roughly follow school absence logs: mostly illness, then family reasons.
+EXCUSED_REASONS = {
+    "Болезнь": 60,
+    "Семейные обстоятельства": 15,
+    "По справке": 12,
+    "Соревнования": 8,
+    "Олимпиада": 5,
+}
+EXCUSED_SHARE = 0.65
+COPY_CHUNK_CLASSES = 200
+
+
+@dataclass
+class SeedReport:
+    classes: int = 0
+    fills: int = 0
+    absences: int = 0
+    weeks: int = 0
+
+
+def class_name(prefix: str, index: int) -> str:
+    school, number = divmod(index, len(GRADES) * len(LETTERS))
+    grade, letter = divmod(number, len(LETTERS))
+    return f"{prefix}-{school + 1:04d}-{GRADES[grade]}{LETTERS[letter]}"
+
+
+def _full_name(rng: random.Random) -> str:
+    surname = rng.choice(MALE_SURNAMES)
+    if rng.random() < 0.5:
+        return f"{surname} {rng.choice(MALE_NAMES)}"
+    return f"{surname}а {rng.choice(FEMALE_NAMES)}"
+
+
+def _roster(rng: random.Random) -> list[tuple[str, float]]:
+    # Each student gets their own absence rate: most are rarely away, a few are away often.
+    names = set()
+    size = rng.randint(20, 32)
+    while len(names) < size:
+        names.add(_full_name(rng))
+    return [(name, rng.betavariate(1.2, 20)) for name in sorted(names)]
+
+
+def school_days(start: date, end: date) -> list[date]:
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _copy_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _class_rows(class_id: int, days: list[date], fill_rate: float, rng: random.Random, filled_at: datetime):
+    # COPY text lines for one class: its attendance_fill rows and its attendance rows.
+    roster = _roster(rng)
+    reasons, weights = list(EXCUSED_REASONS), list(EXCUSED_REASONS.values())
+    sick_until = {}
+    fills, absences = [], []
+    for day in days:
+        if rng.random() >= fill_rate:
+            continue
+        iso_day = day.isoformat()
+        unexcused, excused = [], []
+        for name, rate in roster:
+            if sick_until.get(name, date.min) >= day:
+                excused.append({"fullName": name, "reason": "Болезнь"})
+            elif rng.random() < rate:
+                if rng.random() < EXCUSED_SHARE:
+                    reason = rng.choices(reasons, weights)[0]
+                    if reason == "Болезнь":
+                        # Illness lasts several school days in a row.
+                        sick_until[name] = day + timedelta(days=rng.randint(1, 7))
+                    excused.append({"fullName": name, "reason": reason})
+                else:
+                    unexcused.append(name)
+        # Names and reasons come from the lists above, so only the JSON needs COPY escaping.
+        unexcused_json = json.dumps([{"fullName": name} for name in unexcused], ensure_ascii=False)
+        fills.append(
+            f"{iso_day}\t{class_id}\t{len(roster)}\t{len(roster) - len(unexcused) - len(excused)}\t"
+            f"{_copy_text(unexcused_json)}\t{_copy_text(json.dumps(excused, ensure_ascii=False))}\t1\t{filled_at}"
+        )
+        absences += [f"{iso_day}\t{class_id}\t{name}\tunexcused\t\\N" for name in unexcused]
+        absences += [f"{iso_day}\t{class_id}\t{item['fullName']}\texcused\t{item['reason']}" for item in excused]
+    return fills, absences
+
+
+def _create_classes(conn, names: list[str], password_hash: str) -> list[int]:
+    now = datetime.now()
+    with conn.cursor() as cursor:
+        user_ids = execute_values(
+            cursor,
+            "INSERT INTO users (login, password, role, created_at, updated_at) VALUES %s RETURNING id",
+            [(name, password_hash, "teacher", now, now) for name in names],
+            page_size=1000,
+            fetch=True,
+        )
+        return [
+            row[0]
+            for row in execute_values(
+                cursor,
+                "INSERT INTO classes (name, teacher_id, created_at) VALUES %s RETURNING id",
+                [(name, user_id, now) for name, (user_id,) in zip(names, user_ids)],
+                page_size=1000,
+                fetch=True,
+            )
+        ]
+
+
+def seed(
+    target: Engine,
+    classes: int,
+    days: list[date],
+    password_hash: str,
+    prefix: str = "seed",
+    fill_rate: float = 0.97,
+    random_seed: int = 1,
+) -> SeedReport:
+    # Class accounts are inserted with multi-row INSERTs, fills and absences are streamed
+    # with COPY and committed every COPY_CHUNK_CLASSES classes.
+    rng = random.Random(random_seed)
+    report = SeedReport()
+    names = [class_name(prefix, index) for index in range(classes)]
+    if days:
+        # Without their own partitions the seeded days would all pile up in the default one.
+        with target.connect() as conn:
+            for table in PARTITIONED_TABLES:
+                if is_partitioned(conn, table):
+                    ensure_partitions(conn, table, days[0], days[-1])
+    conn = target.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM users WHERE login = ANY(%s)",
+                (names,),
+            )
+            if cursor.fetchone()[0]:
+                raise ValueError(f"Accounts with the prefix {prefix!r} already exist; pick another --prefix")
+        class_ids = _create_classes(conn, names, password_hash)
+        conn.commit()
+        report.classes = len(class_ids)
+        filled_at = datetime.now()
+        for chunk_start in range(0, len(class_ids), COPY_CHUNK_CLASSES):
+            fills, absences = [], []
+            for class_id in class_ids[chunk_start : chunk_start + COPY_CHUNK_CLASSES]:
+                class_fills, class_absences = _class_rows(class_id, days, fill_rate, rng, filled_at)
+                fills += class_fills
+                absences += class_absences
+            with conn.cursor() as cursor:
+                cursor.copy_expert(
+                    "COPY attendance_fill (date, class_id, total_students, present_count, absent_unexcused, "
+                    "absent_excused, version, filled_at) FROM STDIN",
+                    io.StringIO("\n".join(fills) + "\n" if fills else ""),
+                )
+                cursor.copy_expert(
+                    "COPY attendance (date, class_id, absent_name, status, reason) FROM STDIN",
+                    io.StringIO("\n".join(absences) + "\n" if absences else ""),
+                )
+            conn.commit()
+            report.fills += len(fills)
+            report.absences += len(absences)
+            logger.info(
+                "Seeded %s/%s classes: %s fills, %s absences",
+                min(chunk_start + COPY_CHUNK_CLASSES, len(class_ids)),
+                len(class_ids),
+                report.fills,
+                report.absences,
+            )
+    finally:
+        conn.close()
+    if days:
+        report.weeks = backfill(days[0], bind=target)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic classes, fills and absences.")
+    parser.add_argument("--classes", type=int, default=100, help="class accounts to create")
+    parser.add_argument("--days", type=int, default=180, help="school days of history, weekends are skipped")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="last day (YYYY-MM-DD)")
+    parser.add_argument("--fill-rate", type=float, default=0.97, help="share of school days a class fills")
+    parser.add_argument("--prefix", default="seed", help="class names are <prefix>-<school>-<grade><letter>")
+    parser.add_argument("--password", default="seed-pass", help="password of every created class account")
+    parser.add_argument("--random-seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Enough calendar days to cover the requested school days.
+    span = args.days + 2 * math.ceil(args.days / 5) + 7
+    days = school_days(args.end - timedelta(days=span), args.end)[-args.days :]
+    started = time.perf_counter()
+    try:
+        report = seed(
+            engine,
+            args.classes,
+            days,
+            hash_password_sync(args.password),
+            prefix=args.prefix,
+            fill_rate=args.fill_rate,
+            random_seed=args.random_seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Created %s classes, %s fills, %s absences and %s weekly rollups in %.1f s (%.0f rows/s)",
+        report.classes,
+        report.fills,
+        report.absences,
+        report.weeks,
+        elapsed,
+        (report.fills + report.absences) / elapsed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import logging
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, Engine, and_, cast, func, literal, select, true, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import AttendanceBase, AttendanceFillBase, AttendanceStatusEnum, AttendanceWeeklyBase, engine
+from retention import retention_cutoff
+
+ROLLUP_COLUMNS = (
+    "class_id",
+    "week_start",
+    "days_filled",
+    "total_students",
+    "present_count",
+    "absent_excused",
+    "absent_unexcused",
+    "updated_at",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _week_of(column):
+    # date_trunc('week') truncates to the ISO week's Monday, matching week_start().
+    return cast(func.date_trunc("week", column), Date)
+
+
+def _open_weeks(days: Iterable[tuple[int, date]]) -> list[tuple[int, date]]:
+    # A week that started before the retention cutoff may already have lost days to retention,
+    # and recomputing it would shrink its figures. Its rollup is frozen as it stands: saves into
+    # it change the daily rows only. HISTORY_RETENTION_DAYS >= 7 keeps the current week open.
+    cutoff = retention_cutoff()
+    return sorted({(class_id, week_start(day)) for class_id, day in days if week_start(day) >= cutoff})
+
+
+def _rollup_upsert(fill_filter, absent_filter):
+    fill_week = _week_of(AttendanceFillBase.date)
+    fills = (
+        select(
+            AttendanceFillBase.class_id.label("class_id"),
+            fill_week.label("week_start"),
+            func.count().label("days_filled"),
+            func.sum(AttendanceFillBase.total_students).label("total_students"),
+            func.sum(AttendanceFillBase.present_count).label("present_count"),
+        )
+        .where(fill_filter)
+        .group_by(AttendanceFillBase.class_id, fill_week)
+        .subquery()
+    )
+    absent_week = _week_of(AttendanceBase.date)
+    absences = (
+        select(
+            AttendanceBase.class_id.label("class_id"),
+            absent_week.label("week_start"),
+            func.count().filter(AttendanceBase.status == AttendanceStatusEnum.excused).label("excused"),
+            func.count().filter(AttendanceBase.status == AttendanceStatusEnum.unexcused).label("unexcused"),
+        )
+        .where(absent_filter)
+        .group_by(AttendanceBase.class_id, absent_week)
+        .subquery()
+    )
+    rollup = select(
+        fills.c.class_id,
+        fills.c.week_start,
+        fills.c.days_filled,
+        fills.c.total_students,
+        fills.c.present_count,
+        func.coalesce(absences.c.excused, 0),
+        func.coalesce(absences.c.unexcused, 0),
+        literal(datetime.now()),
+    ).outerjoin(
+        absences,
+        and_(absences.c.class_id == fills.c.class_id, absences.c.week_start == fills.c.week_start),
+    )
+    stmt = pg_insert(AttendanceWeeklyBase).from_select(ROLLUP_COLUMNS, rollup)
+    # Frozen weeks (see _open_weeks) are only ever inserted when missing, never overwritten.
+    return stmt.on_conflict_do_update(
+        constraint="uq_attendance_weekly",
+        set_={column: stmt.excluded[column] for column in ROLLUP_COLUMNS[2:]},
+        where=AttendanceWeeklyBase.week_start >= retention_cutoff(),
+    )
+
+
+async def lock_weeks(s: AsyncSession, days: Iterable[tuple[int, date]]) -> None:
+    # Takes the class-week row locks until commit, so saves of different days in the
+    # same week refresh one after another and each sees the other's committed rows.
+    # Rows are locked in (class_id, week_start) order so concurrent batches cannot deadlock.
+    weeks = _open_weeks(days)
+    if not weeks:
+        return
+    now = datetime.now()
+    stmt = pg_insert(AttendanceWeeklyBase).values(
+        [{"class_id": class_id, "week_start": start, "updated_at": now} for class_id, start in weeks]
+    )
+    stmt = stmt.on_conflict_do_update(constraint="uq_attendance_weekly", set_={"updated_at": stmt.excluded.updated_at})
+    await s.execute(stmt)
+
+
+async def refresh_weeks(s: AsyncSession, days: Iterable[tuple[int, date]]) -> None:
+    weeks = _open_weeks(days)
+    if not weeks:
+        return
+    class_ids = sorted({class_id for class_id, _ in weeks})
+    start, end = weeks[0][1], max(start for _, start in weeks) + timedelta(days=7)
+    # The class and date bounds keep the scan on the (class_id, date) indexes; the tuple
+    # filter drops the class-weeks in that box that were not saved.
+    await s.execute(
+        _rollup_upsert(
+            and_(
+                AttendanceFillBase.class_id.in_(class_ids),
+                AttendanceFillBase.date >= start,
+                AttendanceFillBase.date < end,
+                tuple_(AttendanceFillBase.class_id, _week_of(AttendanceFillBase.date)).in_(weeks),
+            ),
+            and_(
+                AttendanceBase.class_id.in_(class_ids),
+                AttendanceBase.date >= start,
+                AttendanceBase.date < end,
+                tuple_(AttendanceBase.class_id, _week_of(AttendanceBase.date)).in_(weeks),
+            ),
+        )
+    )
+
+
+def backfill(since: date | None = None, bind: Engine | None = None) -> int:
+    if since is None:
+        fill_filter, absent_filter = true(), true()
+    else:
+        start = week_start(since)
+        fill_filter, absent_filter = AttendanceFillBase.date >= start, AttendanceBase.date >= start
+    with (bind or engine).begin() as conn:
+        return conn.execute(_rollup_upsert(fill_filter, absent_filter)).rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild attendance_weekly from attendance_fill and attendance.")
+    parser.add_argument("--since", type=date.fromisoformat, help="only rebuild weeks from this date (YYYY-MM-DD) on")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Rebuilt %s class-week rows", backfill(args.since))
+
+
+if __name__ == "__main__":
+    main()
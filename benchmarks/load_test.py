@@ -0,0 +1,363 @@
+"""End-to-end HTTP load test with per-route latency budgets.
+
+Creates a scratch database next to the one in `app/.env`, seeds N classes with
+D days of history, starts the app under a local uvicorn on it and drives three
+phases of concurrent traffic:
+
+- burst: every class account logs in, loads its classes and saves today's
+  attendance, like the first lesson of the day
+- dashboard: admins poll the dashboard reads (with If-None-Match, as the
+  frontend does) for --duration seconds while classes keep saving
+- exports: admins download 30-day CSV and XLSX exports
+
+Prints throughput and p50/p95/p99 per route and exits with 1 if a route had
+errors or went over its p95 budget. --output writes the results as JSON; --baseline compares
+with such a file from an earlier run.
+
+    python benchmarks/load_test.py --classes 100 --days 60 --workers 2 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from db import RoleEnum, UserBase  # noqa: E402
+from passwords import hash_password_sync  # noqa: E402
+from scratch import CLASS_PREFIX, scratch_database, seed_history  # noqa: E402
+from seed import class_name  # noqa: E402
+
+CLASS_PASSWORD = "bench-pass"
+ADMIN_LOGIN = "bench_admin"
+ADMIN_PASSWORD = "bench-admin-pass"
+SURNAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Васильев", "Петрова", "Соколов", "Михайлова", "Новиков"]
+REASONS = ["Болезнь", "Семейные обстоятельства", "Соревнования"]
+# p95 budgets in ms per route; a route over budget fails the run.
+ROUTE_BUDGETS_P95_MS = {
+    "POST /auth/login": 2000,
+    "GET /classes": 200,
+    "PUT /attendance": 300,
+    "GET /attendance": 300,
+    "GET /attendance/unfilled-classes": 200,
+    "GET /statistics/daily": 300,
+    "GET /statistics/weekly": 300,
+    "GET /statistics/export csv": 3000,
+    "GET /statistics/export xlsx": 5000,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+        self.phases: dict[str, dict] = {}
+
+    async def call(
+        self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs
+    ) -> httpx.Response | None:
+        # Failed requests are counted, not raised, so one error does not end the run.
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            self.errors[route][type(exc).__name__] += 1
+            return None
+        self.latencies[route].append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            # 503 here is usually the bcrypt queue shedding logins (BCRYPT_MAX_PENDING).
+            self.errors[route][str(response.status_code)] += 1
+            return None
+        return response
+
+    async def phase(self, name: str, awaitable) -> None:
+        before = sum(map(len, self.latencies.values()))
+        started = time.perf_counter()
+        await awaitable
+        seconds = time.perf_counter() - started
+        requests = sum(map(len, self.latencies.values())) - before
+        self.phases[name] = {"seconds": round(seconds, 3), "requests": requests, "rps": round(requests / seconds, 1)}
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies.keys() | self.errors.keys()):
+            # A route whose every request failed to connect has no samples at all.
+            ordered = sorted(self.latencies[route]) or [0.0]
+            cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+            budget = ROUTE_BUDGETS_P95_MS.get(route)
+            routes[route] = {
+                "count": len(self.latencies[route]),
+                "errors": dict(self.errors[route]),
+                "rps": round(len(self.latencies[route]) / elapsed, 1),
+                "p50": round(cuts[49], 1),
+                "p95": round(cuts[94], 1),
+                "p99": round(cuts[98], 1),
+                "max": round(ordered[-1], 1),
+                "budget_p95": budget,
+                "over_budget": budget is not None and cuts[94] > budget,
+            }
+        return routes
+
+
+def _absences(rng: random.Random) -> tuple[list[str], list[dict]]:
+    names = rng.sample(SURNAMES, rng.randint(0, 4))
+    split = rng.randint(0, len(names))
+    return names[:split], [{"fullName": name, "reason": rng.choice(REASONS)} for name in names[split:]]
+
+
+async def _class_morning(client, recorder: Recorder, login: str, today: date, rng: random.Random) -> None:
+    response = await recorder.call(
+        client, "POST /auth/login", "POST", "/auth/login", json={"login": login, "password": CLASS_PASSWORD}
+    )
+    if response is None:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['accessToken']}"}
+    response = await recorder.call(client, "GET /classes", "GET", "/classes", headers=headers)
+    if response is None:
+        return
+    class_id = response.json()[0]["id"]
+    unexcused, excused = _absences(rng)
+    await recorder.call(
+        client,
+        "PUT /attendance",
+        "PUT",
+        f"/attendance?date={today.isoformat()}",
+        headers=headers,
+        json={
+            "classId": class_id,
+            "totalStudents": 30,
+            "presentCount": 30 - len(unexcused) - len(excused),
+            "absentUnexcused": unexcused,
+            "absentExcused": excused,
+        },
+    )
+
+
+async def _burst(client, recorder: Recorder, logins: list[str], today: date, concurrency: int, seed: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(seed)
+
+    async def one(login):
+        async with semaphore:
+            await _class_morning(client, recorder, login, today, rng)
+
+    await asyncio.gather(*(one(login) for login in logins))
+
+
+async def _dashboard(client, recorder: Recorder, admin_headers: dict, today: date, deadline: float, seed: int) -> None:
+    rng = random.Random(seed)
+    etags = {}
+    reads = [
+        ("GET /attendance/unfilled-classes", f"/attendance/unfilled-classes?date={today}"),
+        ("GET /statistics/daily", f"/statistics/daily?date={today}"),
+        ("GET /attendance", f"/attendance?date={today}"),
+        ("GET /statistics/weekly", f"/statistics/weekly?date={today}"),
+        ("GET /classes", "/classes"),
+    ]
+    while time.perf_counter() < deadline:
+        route, url = rng.choice(reads)
+        headers = {**admin_headers, **({"If-None-Match": etags[url]} if url in etags else {})}
+        response = await recorder.call(client, route, "GET", url, headers=headers)
+        if response is not None and (etag := response.headers.get("ETag")):
+            etags[url] = etag
+        await asyncio.sleep(rng.uniform(0.05, 0.25))
+
+
+async def _late_saves(client, recorder: Recorder, logins: list[str], today: date, deadline: float, seed: int) -> None:
+    # Classes that fill in late keep invalidating the dashboard's ETags.
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        await _class_morning(client, recorder, rng.choice(logins), today, rng)
+        await asyncio.sleep(rng.uniform(0.2, 1.0))
+
+
+async def _exports(client, recorder: Recorder, admin_headers: dict, today: date, count: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    start = today - timedelta(days=29)
+
+    async def one(index):
+        export_format = "csv" if index % 2 == 0 else "xlsx"
+        async with semaphore:
+            await recorder.call(
+                client,
+                f"GET /statistics/export {export_format}",
+                "GET",
+                f"/statistics/export?from={start}&to={today}&format={export_format}",
+                headers=admin_headers,
+            )
+
+    await asyncio.gather(*(one(index) for index in range(count)))
+
+
+async def _drive(base_url: str, args) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    today = date.today()
+    logins = [class_name(CLASS_PREFIX, index) for index in range(args.classes)]
+    limits = httpx.Limits(max_connections=args.concurrency + args.admins + 4)
+    async with httpx.AsyncClient(base_url=f"{base_url}/api/v1", limits=limits, timeout=120) as client:
+        response = await client.post("/auth/login", json={"login": ADMIN_LOGIN, "password": ADMIN_PASSWORD})
+        response.raise_for_status()
+        admin_headers = {"Authorization": f"Bearer {response.json()['accessToken']}"}
+        started = time.perf_counter()
+        await recorder.phase("burst", _burst(client, recorder, logins, today, args.concurrency, args.seed))
+        deadline = time.perf_counter() + args.duration
+        await recorder.phase(
+            "dashboard",
+            asyncio.gather(
+                *(_dashboard(client, recorder, admin_headers, today, deadline, args.seed + i) for i in range(args.admins)),
+                _late_saves(client, recorder, logins, today, deadline, args.seed),
+            ),
+        )
+        await recorder.phase(
+            "exports", _exports(client, recorder, admin_headers, today, args.exports, max(1, args.admins // 2))
+        )
+    return recorder, time.perf_counter() - started
+
+
+def _create_admin(url) -> None:
+    # Created up front: every uvicorn worker seeds the default admin at startup, and on
+    # an empty database they race on the unique login.
+    engine = create_engine(url)
+    try:
+        with Session(engine) as s, s.begin():
+            s.add(UserBase(login=ADMIN_LOGIN, password=hash_password_sync(ADMIN_PASSWORD), role=RoleEnum.admin))
+    finally:
+        engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(url, port: int, workers: int, days: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DB_URL": url.render_as_string(hide_password=False),
+        "ADMIN_LOGIN": ADMIN_LOGIN,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        # Keep the seeded history: the default retention would purge it at startup.
+        "HISTORY_RETENTION_DAYS": str(days + 7),
+    }
+    env.pop("ASYNC_DB_URL", None)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", "app", "--host", "127.0.0.1"]
+    command += ["--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def _wait_for_server(base_url: str, server: subprocess.Popen, timeout_seconds: float = 60) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/ping", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("uvicorn did not become ready")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_report(result: dict, baseline: dict | None) -> None:
+    for name, phase in result["phases"].items():
+        print(f"{name:<10} {phase['requests']:>6} requests in {phase['seconds']:>6.1f} s ({phase['rps']} req/s)")
+    print()
+    header = f"{'route':<34}{'count':>7}{'err':>5}{'rps':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'budget':>8}"
+    if baseline:
+        header += f"{'p95 was':>9}"
+    print(header)
+    for route, row in result["routes"].items():
+        line = f"{route:<34}{row['count']:>7}{sum(row['errors'].values()):>5}{row['rps']:>7}"
+        line += f"{row['p50']:>8}{row['p95']:>8}{row['p99']:>8}{row['budget_p95'] or '-':>8}"
+        if baseline:
+            previous = baseline["routes"].get(route)
+            line += f"{previous['p95'] if previous else '-':>9}"
+        if row["over_budget"]:
+            line += "  OVER BUDGET"
+        if row["errors"]:
+            line += "  errors: " + ", ".join(f"{key} x{count}" for key, count in row["errors"].items())
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--days", type=int, default=60, help="days of seeded history before today")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=20, help="classes saving at once during the burst")
+    parser.add_argument("--admins", type=int, default=5, help="admins polling the dashboard")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of dashboard traffic")
+    parser.add_argument("--exports", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results of an earlier run to compare with")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database for inspection")
+    args = parser.parse_args()
+
+    with scratch_database("load_test", keep=args.keep) as url:
+        today = date.today()
+        counts = seed_history(
+            url,
+            args.classes,
+            today - timedelta(days=args.days),
+            today - timedelta(days=1),
+            password_hash=hash_password_sync(CLASS_PASSWORD),
+        )
+        print(f"seeded {counts}")
+        _create_admin(url)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = _start_server(url, port, args.workers, args.days)
+        try:
+            _wait_for_server(base_url, server)
+            recorder, elapsed = asyncio.run(_drive(base_url, args))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seeded": counts,
+            **{key: value for key, value in vars(args).items() if key not in {"output", "baseline", "keep"}},
+        },
+        "phases": recorder.phases,
+        "routes": recorder.summary(elapsed),
+    }
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    _print_report(result, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    sys.exit(1 if any(row["over_budget"] or row["errors"] for row in result["routes"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
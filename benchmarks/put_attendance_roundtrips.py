@@ -0,0 +1,79 @@
+"""Round-trip count of the PUT /attendance save path.
+
+Runs `_save_attendance` against the configured database for growing numbers of
+absent names and prints how many SQL statements each save issued. Everything
+runs inside a transaction that is rolled back, so no data is left behind.
+
+    python benchmarks/put_attendance_roundtrips.py --sizes 0 5 25 100
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from sqlalchemy import event  # noqa: E402
+
+from db import AsyncSessionLocal, ClassBase, RoleEnum, UserBase, async_engine  # noqa: E402
+from routes.teacher import _save_attendance  # noqa: E402
+
+
+async def _measure(sizes: list[int], repeats: int) -> list[dict]:
+    statements = 0
+
+    def _count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count)
+    results = []
+    try:
+        async with AsyncSessionLocal() as s:
+            user = UserBase(login=f"bench_{time.time_ns()}", password="-", role=RoleEnum.teacher)
+            s.add(user)
+            await s.flush()
+            class_row = ClassBase(name=user.login, teacher_id=user.id)
+            s.add(class_row)
+            await s.flush()
+            for size in sizes:
+                unexcused = [f"Ученик {i}" for i in range(size // 2)]
+                excused = [{"fullName": f"Ученица {i}", "reason": "Болезнь"} for i in range(size - size // 2)]
+                elapsed = 0.0
+                statements = 0
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    await _save_attendance(s, date.today(), class_row.id, size + 1, 1, unexcused, excused)
+                    elapsed += time.perf_counter() - started
+                results.append(
+                    {
+                        "absent": size,
+                        "statements": statements / repeats,
+                        "ms": elapsed * 1000 / repeats,
+                    }
+                )
+            await s.rollback()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _count)
+        await async_engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1, 5, 25, 100, 500])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    async_engine.echo = False
+    results = asyncio.run(_measure(args.sizes, args.repeats))
+    print(f"{'absent':>8} {'statements':>12} {'ms/save':>10}")
+    for row in results:
+        print(f"{row['absent']:>8} {row['statements']:>12.1f} {row['ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
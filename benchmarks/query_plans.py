@@ -0,0 +1,182 @@
+"""Query-plan regression check for the hot attendance read endpoints.
+
+Creates a scratch database next to the one in `app/.env`, seeds it with a
+realistic volume of classes, fill rows and absences, then runs the real route
+handlers against it. Every statement they send to `attendance` or
+`attendance_fill` is replayed under EXPLAIN (ANALYZE, BUFFERS); the script
+fails if one of them scans a table sequentially (or a daily partition while
+discarding some of its rows) or runs longer than the budget.
+The scratch database is dropped afterwards unless --keep is given.
+
+    python benchmarks/query_plans.py --classes 300 --days 365 --budget-ms 50
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from fastapi.responses import Response  # noqa: E402
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from class_directory import directory  # noqa: E402
+from db import _async_db_url  # noqa: E402
+from routes.teacher import (  # noqa: E402
+    export_statistics_range,
+    get_attendance,
+    get_daily_statistics,
+    get_unfilled_classes,
+)
+from scratch import scratch_database, seed_history  # noqa: E402
+from utils.jwt import create_jwt  # noqa: E402
+
+HOT_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+attendance(?:_fill)?\b", re.IGNORECASE)
+CHECKED_RELATIONS = {"attendance", "attendance_fill"}
+# Daily partitions (see app/partitions.py) are checked as the table they belong to.
+PARTITION_SUFFIX = re.compile(r"_(?:p\d{8}|default)$")
+
+
+def _request(token: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "query_string": b"",
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+        }
+    )
+
+
+def _cases(target: date, admin: Request, teacher: Request, teacher_class_id: int) -> dict:
+    return {
+        "GET /attendance (all classes)": lambda s: get_attendance(target, admin, Response(), s),
+        "GET /attendance?classId": lambda s: get_attendance(target, teacher, Response(), s, teacher_class_id),
+        "GET /statistics/daily (all classes)": lambda s: get_daily_statistics(target, admin, Response(), s),
+        "GET /attendance/unfilled-classes": lambda s: get_unfilled_classes(target, admin, Response(), s),
+        "GET /statistics/export (30 days)": lambda s: export_statistics_range(
+            admin, s, target - timedelta(days=29), target, None, "xlsx"
+        ),
+    }
+
+
+def _plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _check_plan(plan: dict, budget_ms: float) -> tuple[list[str], list[str]]:
+    # Scans of daily partitions are grouped per table: one line per scan type, not per day.
+    partition_scans = defaultdict(lambda: {"partitions": 0, "heap_fetches": 0})
+    scans, problems = [], []
+    for node in _plan_nodes(plan["Plan"]):
+        relation = node.get("Relation Name", "")
+        table = PARTITION_SUFFIX.sub("", relation)
+        if table not in CHECKED_RELATIONS:
+            continue
+        if relation != table:
+            group = partition_scans[f"{node['Node Type']} on {table}"]
+            group["partitions"] += 1
+            group["heap_fetches"] += node.get("Heap Fetches", 0)
+        else:
+            scan = f"{node['Node Type']} on {relation}"
+            index_names = [child["Index Name"] for child in _plan_nodes(node) if "Index Name" in child]
+            if index_names:
+                scan += f" using {', '.join(index_names)}"
+            if node.get("Heap Fetches"):
+                scan += f" ({node['Heap Fetches']} heap fetches)"
+            scans.append(scan)
+        # Reading a whole partition is the cheapest plan when the query wants every row of its day;
+        # a sequential scan is a problem when it reads rows only to throw them away.
+        if node["Node Type"] == "Seq Scan" and (relation == table or node.get("Rows Removed by Filter")):
+            problems.append(f"sequential scan on {relation}")
+    for scan, group in partition_scans.items():
+        scan += f" ({group['partitions']} partition{'s' if group['partitions'] > 1 else ''}"
+        if group["heap_fetches"]:
+            scan += f", {group['heap_fetches']} heap fetches"
+        scans.append(scan + ")")
+    if plan["Execution Time"] > budget_ms:
+        problems.append(f"{plan['Execution Time']:.1f} ms is over the {budget_ms:g} ms budget")
+    return scans, problems
+
+
+async def _run(url: str, cases_args: tuple, budget_ms: float) -> bool:
+    engine = create_async_engine(_async_db_url(url))
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    captured = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if HOT_TABLES.search(statement):
+            captured.append((statement, parameters))
+
+    ok = True
+    try:
+        for name, call in _cases(*cases_args).items():
+            async with sessions() as s:
+                await call(s)  # warms the class directory and the buffer cache
+                captured.clear()
+                event.listen(engine.sync_engine, "before_cursor_execute", _capture)
+                try:
+                    await call(s)
+                finally:
+                    event.remove(engine.sync_engine, "before_cursor_execute", _capture)
+                print(f"\n{name}")
+                conn = await s.connection()
+                for statement, parameters in captured:
+                    result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+                    plan = result.scalar()
+                    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]
+                    scans, problems = _check_plan(plan, budget_ms)
+                    ok = ok and not problems
+                    buffers = plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)
+                    print(f"  {'FAIL' if problems else 'ok  '} {plan['Execution Time']:7.2f} ms {buffers:6} buffers")
+                    for line in scans + problems:
+                        print(f"       {line}")
+    finally:
+        directory.invalidate()
+        await engine.dispose()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=300)
+    parser.add_argument("--days", type=int, default=365, help="days of history, weekends are skipped")
+    parser.add_argument("--fill-rate", type=float, default=0.95, help="share of class-days that are filled")
+    parser.add_argument("--budget-ms", type=float, default=50, help="execution time allowed per statement")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database for inspection")
+    args = parser.parse_args()
+
+    with scratch_database("query_plans", keep=args.keep) as url:
+        # The most recent school day, so the checked date has data.
+        target = date.today() - timedelta(days=max(date.today().weekday() - 4, 0))
+        started = time.perf_counter()
+        counts = seed_history(
+            url, args.classes, target - timedelta(days=args.days - 1), target, args.fill_rate
+        )
+        print(f"seeded {counts} in {time.perf_counter() - started:.1f} s")
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            teacher_class_id, teacher_id = conn.execute(
+                text("SELECT id, teacher_id FROM classes ORDER BY id LIMIT 1")
+            ).one()
+        engine.dispose()
+        # Handlers only read the role and user id from the token.
+        admin = _request(create_jwt({"sub": "0", "role": "admin"}, timedelta(hours=1)))
+        teacher = _request(create_jwt({"sub": str(teacher_id), "role": "teacher"}, timedelta(hours=1)))
+        ok = asyncio.run(_run(url, (target, admin, teacher, teacher_class_id), args.budget_ms))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
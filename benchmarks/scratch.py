@@ -0,0 +1,60 @@
+"""Scratch database helpers shared by the benchmarks that need seeded data."""
+
+import sys
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.engine import URL, make_url  # noqa: E402
+
+from db import DB_URL, Base  # noqa: E402
+from seed import school_days, seed  # noqa: E402
+
+CLASS_PREFIX = "bench"
+
+
+@contextmanager
+def scratch_database(suffix: str, keep: bool = False):
+    # A fresh database next to the configured one, so benchmarks never touch real data.
+    base_url = make_url(DB_URL)
+    url = base_url.set(database=f"{base_url.database}_{suffix}")
+    admin_engine = create_engine(base_url, isolation_level="AUTOCOMMIT")
+    try:
+        with admin_engine.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+            conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+        try:
+            yield url
+        finally:
+            if not keep:
+                with admin_engine.connect() as conn:
+                    conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}" WITH (FORCE)'))
+    finally:
+        admin_engine.dispose()
+
+
+def seed_history(
+    url: URL,
+    classes: int,
+    start: date,
+    end: date,
+    fill_rate: float = 0.95,
+    password_hash: str = "-",
+) -> dict:
+    # Class accounts are named by seed.class_name(CLASS_PREFIX, 0..N-1); weekends are skipped.
+    engine = create_engine(url)
+    try:
+        Base.metadata.create_all(engine)
+        seed(engine, classes, school_days(start, end), password_hash, prefix=CLASS_PREFIX, fill_rate=fill_rate)
+        # VACUUM sets the visibility map, without which no scan can be index-only.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE"))
+            return {
+                table: conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+                for table in ("classes", "attendance_fill", "attendance")
+            }
+    finally:
+        engine.dispose()
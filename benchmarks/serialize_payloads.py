@@ -0,0 +1,145 @@
+"""Serialization cost of the all-classes attendance and statistics payloads.
+
+Builds a synthetic payload for N classes (no database needed) and times the
+path from handler data to response bytes two ways:
+
+- dicts: hand-built dicts through jsonable_encoder and the stdlib JSONResponse,
+  as the handlers did before they had response models
+- models: the typed response models through the route's response field and the
+  app's orjson default response class
+
+    python benchmarks/serialize_payloads.py --classes 200 --absent 6
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+from class_directory import ClassEntry  # noqa: E402
+from db import AttendanceBase, AttendanceFillBase, AttendanceStatusEnum  # noqa: E402
+from responses import OrjsonResponse  # noqa: E402
+from routes.teacher import _attendance_from_fill, _daily_stats_for_class, router  # noqa: E402
+
+
+def _fixtures(classes: int, absent: int, target_date: date):
+    class_rows = tuple(ClassEntry(i, f"{i % 11 + 1}-А", i, f"teacher{i}") for i in range(1, classes + 1))
+    fills, absences = {}, {}
+    for row in class_rows:
+        unexcused = [{"fullName": f"Ученик {row.id}-{i}"} for i in range(absent // 2)]
+        excused = [{"fullName": f"Ученица {row.id}-{i}", "reason": "Болезнь"} for i in range(absent - absent // 2)]
+        fills[row.id] = AttendanceFillBase(
+            date=target_date,
+            class_id=row.id,
+            total_students=30,
+            present_count=30 - absent,
+            absent_unexcused=unexcused,
+            absent_excused=excused,
+        )
+        absences[row.id] = [
+            AttendanceBase(
+                date=target_date,
+                class_id=row.id,
+                absent_name=item["fullName"],
+                status=AttendanceStatusEnum.excused if "reason" in item else AttendanceStatusEnum.unexcused,
+                reason=item.get("reason"),
+            )
+            for item in unexcused + excused
+        ]
+    return class_rows, fills, absences
+
+
+def _attendance_dicts(target_date, class_rows, fills):
+    return [
+        {
+            "date": target_date.isoformat(),
+            "classId": row.id,
+            "isFilled": True,
+            "totalStudents": fills[row.id].total_students,
+            "presentCount": fills[row.id].present_count,
+            "absentUnexcused": fills[row.id].absent_unexcused,
+            "absentExcused": fills[row.id].absent_excused,
+        }
+        for row in class_rows
+    ]
+
+
+def _daily_stats_dicts(target_date, class_rows, absences):
+    return [
+        {
+            "date": target_date.isoformat(),
+            "classId": row.id,
+            "className": row.name,
+            "totalAbsent": len(absences[row.id]),
+            "absent": [
+                {
+                    "fullName": item.absent_name,
+                    "classId": row.id,
+                    "className": row.name,
+                    "reason": item.reason or "Неуважительная причина",
+                }
+                for item in absences[row.id]
+            ],
+        }
+        for row in class_rows
+    ]
+
+
+def _response_field(path: str):
+    return next(route.response_field for route in router.routes if route.path == path)
+
+
+async def _time(fn, repeats: int) -> tuple[float, int]:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        body = await fn()
+    return (time.perf_counter() - started) * 1000 / repeats, len(body)
+
+
+async def _run(classes: int, absent: int, repeats: int) -> None:
+    target_date = date.today()
+    class_rows, fills, absences = _fixtures(classes, absent, target_date)
+    cases = {
+        "/attendance": (
+            lambda: _attendance_dicts(target_date, class_rows, fills),
+            lambda: [_attendance_from_fill(target_date, row.id, fills[row.id]) for row in class_rows],
+        ),
+        "/statistics/daily": (
+            lambda: _daily_stats_dicts(target_date, class_rows, absences),
+            lambda: [_daily_stats_for_class(target_date, row, absences[row.id]) for row in class_rows],
+        ),
+    }
+    print(f"{classes} classes, {absent} absent per class, {repeats} repeats")
+    print(f"{'endpoint':<20}{'dicts ms':>10}{'models ms':>11}{'speedup':>9}{'bytes':>9}")
+    for path, (build_dicts, build_models) in cases.items():
+        field = _response_field(path)
+
+        async def before():
+            return JSONResponse(await serialize_response(response_content=build_dicts())).body
+
+        async def after():
+            return OrjsonResponse(await serialize_response(field=field, response_content=build_models())).body
+
+        before_ms, size = await _time(before, repeats)
+        after_ms, _ = await _time(after, repeats)
+        print(f"{path:<20}{before_ms:>10.2f}{after_ms:>11.2f}{before_ms / after_ms:>8.1f}x{size:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--absent", type=int, default=6, help="absent students per class")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(_run(args.classes, args.absent, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
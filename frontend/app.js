@@ -3,11 +3,11 @@ const state = {
   token: "",
   role: "",
   userId: null,
-  users: [],
   classes: [],
   selectedClassId: null,
   attendanceEditClassId: null,
   attendanceLoadRequestId: 0,
+  unfilledView: null,
 };
 
 const THEME_KEY = "attendance_theme";
@@ -54,14 +54,28 @@ const toggleTheme = () => {
   localStorage.setItem(THEME_KEY, nextTheme);
 };
 
+// GET responses with an ETag are kept per path and revalidated with If-None-Match;
+// a 304 reuses the cached body instead of downloading it again.
+const etagCache = new Map();
+
 const request = async (path, options = {}) => {
   const headers = options.headers || {};
   if (state.token) headers.Authorization = `Bearer ${state.token}`;
-  const res = await fetch(`${state.apiBase}${path}`, { ...options, headers });
+  const isGet = (options.method || "GET").toUpperCase() === "GET";
+  const cached = isGet ? etagCache.get(path) : null;
+  if (cached) headers["If-None-Match"] = cached.etag;
+  const res = await fetch(`${state.apiBase}${path}`, { ...options, headers, cache: "no-store" });
+  if (res.status === 304 && cached) {
+    return structuredClone(cached.data);
+  }
   const data = await res.json().catch(() => ({}));
   if (!res.ok) {
     throw new Error(data.message || `HTTP ${res.status}`);
   }
+  const etag = res.headers.get("ETag");
+  if (isGet && etag) {
+    etagCache.set(path, { etag, data: structuredClone(data) });
+  }
   return data;
 };
 
@@ -76,11 +90,6 @@ const findClassById = (classId) => {
   return state.classes.find((row) => row.id === Number(classId)) || null;
 };
 
-const findUserById = (userId) => {
-  if (!userId) return null;
-  return state.users.find((row) => row.id === Number(userId)) || null;
-};
-
 const activateTab = (id) => {
   document.querySelectorAll(".tab").forEach((t) => t.classList.remove("active"));
   document.querySelectorAll(".tab-content").forEach((v) => v.classList.remove("active"));
@@ -103,13 +112,6 @@ const renderItems = (containerId, items, formatter) => {
   });
 };
 
-const loadUsers = async () => {
-  if (state.role !== "admin") return;
-  const users = await request("/users");
-  state.users = users;
-  renderSelectedClassMeta();
-};
-
 const populateAttendanceClassSelect = (classes) => {
   const classSelectIds = ["attendanceEditClassId", "attendanceClassId", "statsClassId"];
   classSelectIds.forEach((id) => {
@@ -183,8 +185,7 @@ const renderSelectedClassMeta = () => {
     setClassManagementEnabled(false);
     return;
   }
-  const classAccount = findUserById(classRow.teacherId);
-  meta.textContent = `Класс: #${classRow.id} ${classRow.name}. Логин класса: ${classAccount ? `${classAccount.login} (id: ${classAccount.id})` : `id ${classRow.teacherId}`}`;
+  meta.textContent = `Класс: #${classRow.id} ${classRow.name}. Логин класса: ${classRow.teacherLogin ? `${classRow.teacherLogin} (id: ${classRow.teacherId})` : `id ${classRow.teacherId}`}`;
   setClassManagementEnabled(true);
 };
 
@@ -493,6 +494,11 @@ const exportStatsFile = async (format = "xlsx") => {
 const loadUnfilledClasses = async () => {
   const selectedDate = el("statsDate").value;
   const data = await request(`/attendance/unfilled-classes?date=${selectedDate}`);
+  state.unfilledView = { date: selectedDate, rows: data || [] };
+  renderUnfilledClasses(data);
+};
+
+const renderUnfilledClasses = (data) => {
   const container = el("unfilledClassesResult");
   container.innerHTML = "";
   if (!data || data.length === 0) {
@@ -514,6 +520,75 @@ const loadUnfilledClasses = async () => {
     .join(", ")}</div>`;
 };
 
+const LIVE_EVENTS_RETRY_MS = 5000;
+const liveEvents = { controller: null, retryTimer: null };
+
+const handleLiveEvent = async (name, data) => {
+  const view = state.unfilledView;
+  if (!view) return;
+  if (name === "fill") {
+    if (data.date !== view.date) return;
+    const filled = new Set(data.classIds);
+    view.rows = view.rows.filter((row) => !filled.has(row.id));
+    renderUnfilledClasses(view.rows);
+    return;
+  }
+  // "classes" (a class was added or removed) and "resync" (events may have been missed).
+  await loadUnfilledClasses();
+};
+
+const stopLiveEvents = () => {
+  clearTimeout(liveEvents.retryTimer);
+  liveEvents.controller?.abort();
+  liveEvents.controller = null;
+};
+
+const startLiveEvents = async () => {
+  stopLiveEvents();
+  const controller = new AbortController();
+  liveEvents.controller = controller;
+  let retryMs = LIVE_EVENTS_RETRY_MS;
+  try {
+    // fetch instead of EventSource, which cannot send the Authorization header.
+    const res = await fetch(`${state.apiBase}/events/attendance`, {
+      headers: { Authorization: `Bearer ${state.token}` },
+      signal: controller.signal,
+      cache: "no-store",
+    });
+    if (res.status === 401) return;
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+    handleLiveEvent("resync", {}).catch(() => {});
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        // The server closes streams after a while; reconnect right away.
+        retryMs = 0;
+        break;
+      }
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        let name = "message";
+        let data = "";
+        block.split("\n").forEach((line) => {
+          if (line.startsWith("event: ")) name = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        });
+        if (data) handleLiveEvent(name, JSON.parse(data)).catch(() => {});
+      }
+    }
+  } catch {
+    if (controller.signal.aborted) return;
+  }
+  if (liveEvents.controller === controller) {
+    liveEvents.retryTimer = setTimeout(startLiveEvents, retryMs);
+  }
+};
+
 const initSession = () => {
   const saved = localStorage.getItem("attendance_session");
   if (!saved) return;
@@ -548,9 +623,11 @@ const clearSession = () => {
   state.token = "";
   state.role = "";
   state.userId = null;
-  state.users = [];
   state.classes = [];
   state.selectedClassId = null;
+  state.unfilledView = null;
+  stopLiveEvents();
+  etagCache.clear();
   localStorage.removeItem("attendance_session");
 };
 
@@ -562,8 +639,8 @@ const openAppView = async () => {
   resetAttendanceEditor(state.role === "admin" ? "Выберите класс и дату" : "Выберите дату");
   activateTab(state.role === "admin" ? "classesTab" : "attendanceTab");
   await loadClasses();
-  if (state.role === "admin") await loadUsers();
   if (state.role === "teacher") await loadAttendanceForEdit();
+  startLiveEvents();
 };
 
 const bindEvents = () => {
@@ -641,7 +718,6 @@ const bindEvents = () => {
         el("dashboardClassSelect").value = String(classId);
       }
       await loadClasses();
-      await loadUsers();
       toast("Учётные данные обновлены");
     } catch (err) {
       toast(err.message, true);
@@ -662,7 +738,6 @@ const bindEvents = () => {
         body: JSON.stringify(payload),
       });
       e.target.reset();
-      await loadUsers();
       toast("Собственные учётные данные обновлены");
     } catch (err) {
       toast(err.message, true);
@@ -682,13 +757,35 @@ const bindEvents = () => {
       });
       e.target.reset();
       await loadClasses();
-      await loadUsers();
       toast("Класс создан");
     } catch (err) {
       toast(err.message, true);
     }
   });
 
+  el("importClassesForm")?.addEventListener("submit", async (e) => {
+    e.preventDefault();
+    try {
+      const body = new FormData();
+      body.append("file", el("classesCsv").files[0]);
+      const result = await request("/classes/import", { method: "POST", body });
+      e.target.reset();
+      await loadClasses();
+      const failed = result.results.filter((row) => row.status !== 201);
+      if (failed.length) {
+        const details = failed
+          .slice(0, 5)
+          .map((row) => `строка ${row.line}: ${row.message}`)
+          .join("; ");
+        toast(`Создано классов: ${result.created}. Ошибки (${failed.length}): ${details}`, true);
+      } else {
+        toast(`Создано классов: ${result.created}`);
+      }
+    } catch (err) {
+      toast(err.message, true);
+    }
+  });
+
   el("deleteClassBtn")?.addEventListener("click", async () => {
     try {
       if (state.role !== "admin") throw new Error("Forbidden");
@@ -704,7 +801,6 @@ const bindEvents = () => {
       state.selectedClassId = null;
       if (el("dashboardClassSelect")) el("dashboardClassSelect").value = "";
       await loadClasses();
-      await loadUsers();
       toast("Класс удалён");
     } catch (err) {
       toast(err.message, true);
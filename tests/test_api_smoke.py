@@ -1,6 +1,8 @@
+import os
 import subprocess
+import threading
 import time
-from datetime import date
+from datetime import date, timedelta
 
 import pytest
 import requests
@@ -8,6 +10,13 @@ import requests
 
 BASE_URL = "http://127.0.0.1:8099"
 API_URL = f"{BASE_URL}/api/v1"
+# SQL statements each endpoint may run, whatever the input size; a growing count is an N+1.
+QUERY_BUDGETS = {
+    "PUT /attendance": 6,
+    "PATCH /classes/{id}/credentials": 6,
+    "DELETE /classes/{id}": 9,
+    "POST /classes/import": 4,
+}
 
 
 def _wait_for_server(timeout_seconds: int = 45) -> None:
@@ -40,6 +49,7 @@ def server_process():
         ],
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
+        env={**os.environ, "SQL_DEBUG_HEADERS": "on"},
     )
     try:
         _wait_for_server()
@@ -52,6 +62,50 @@ def server_process():
             process.kill()
 
 
+@pytest.fixture
+def query_budget(admin_headers):
+    # The server runs with SQL_DEBUG_HEADERS=on, so every response carries its SQL counts.
+    def measure(method: str, path: str, endpoint: str, size: int, **kwargs):
+        # A class change drops the class directory; reload it first so no request pays for that.
+        _request("GET", "/classes?limit=1", 200, headers=admin_headers)
+        response = _request(method, path, 200, **kwargs)
+        statements = int(response.headers["X-SQL-Statements"])
+        round_trips = int(response.headers["X-SQL-Round-Trips"])
+        budget = QUERY_BUDGETS[endpoint]
+        assert statements <= budget and round_trips <= budget, (
+            f"{endpoint} with input size {size} ran {statements} statements in {round_trips} round trips, "
+            f"budget is {budget}"
+        )
+        return response
+
+    return measure
+
+
+@pytest.fixture
+def admin_headers(server_process):
+    admin_token = _request(
+        "POST", "/auth/login", 200, json={"login": "admin", "password": "admin123"}
+    ).json()["accessToken"]
+    return {"Authorization": f"Bearer {admin_token}"}
+
+
+@pytest.fixture
+def class_account(admin_headers):
+    # A fresh class for one test: yields (class_id, login, password) and deletes the class afterwards.
+    login = f"Class_{time.time_ns()}"
+    password = "pass1234"
+    _request("POST", "/classes", 201, headers=admin_headers, json={"name": login, "password": password})
+    class_id = next(
+        item["id"] for item in _request("GET", "/classes", 200, headers=admin_headers).json() if item["name"] == login
+    )
+    try:
+        yield class_id, login, password
+    finally:
+        # The test may have deleted the class itself.
+        response = requests.delete(f"{API_URL}/classes/{class_id}", headers=admin_headers, timeout=90)
+        assert response.status_code in (200, 404), response.text
+
+
 def _request(method: str, path: str, expected_status: int, **kwargs):
     response = requests.request(method, f"{API_URL}{path}", timeout=90, **kwargs)
     assert (
@@ -122,6 +176,26 @@ def test_full_api_smoke(server_process):
     assert not any(item["id"] == unfilled_class_id for item in classes_after_delete)
     unfilled_class_id = None
 
+    imported = _request(
+        "POST",
+        "/classes/import",
+        200,
+        headers=admin_headers,
+        files={
+            "file": (
+                "classes.csv",
+                f"name,password\nImported_{ts}_a,pass1\nImported_{ts}_b,pass2\nadmin,pass3\n,pass4\n".encode(),
+                "text/csv",
+            )
+        },
+    ).json()
+    assert imported["created"] == 2
+    assert [item["status"] for item in imported["results"]] == [201, 201, 409, 400]
+    _request("POST", "/auth/login", 200, json={"login": f"Imported_{ts}_a", "password": "pass1"})
+    for item in _request("GET", "/classes", 200, headers=admin_headers).json():
+        if item["name"].startswith(f"Imported_{ts}_"):
+            _request("DELETE", f"/classes/{item['id']}", 200, headers=admin_headers)
+
     login_teacher = _request(
         "POST",
         "/auth/login",
@@ -157,7 +231,15 @@ def test_full_api_smoke(server_process):
         },
     )
 
-    attendance_single = _request("GET", f"/attendance?date={today}&classId={class_id}", 200, headers=teacher_headers).json()
+    attendance_response = _request("GET", f"/attendance?date={today}&classId={class_id}", 200, headers=teacher_headers)
+    attendance_etag = attendance_response.headers["ETag"]
+    _request(
+        "GET",
+        f"/attendance?date={today}&classId={class_id}",
+        304,
+        headers={**teacher_headers, "If-None-Match": attendance_etag},
+    )
+    attendance_single = attendance_response.json()
     assert "isFilled" in attendance_single, "Attendance response must include isFilled"
     assert attendance_single["isFilled"] is True
     assert attendance_single["totalStudents"] == 25
@@ -219,6 +301,17 @@ def test_full_api_smoke(server_process):
     ).json()
     assert isinstance(teacher_all_classes_daily, list), "Teacher daily statistics without classId must be a list"
     assert any(item["classId"] == class_id for item in teacher_all_classes_daily)
+    weekly_stats = _request(
+        "GET",
+        f"/statistics/weekly?date={today}&classId={class_id}",
+        200,
+        headers=teacher_headers,
+    ).json()
+    assert weekly_stats["daysFilled"] == 1
+    assert weekly_stats["totalStudents"] == 25
+    assert weekly_stats["presentCount"] == 23
+    assert weekly_stats["absentUnexcused"] == 1
+    assert weekly_stats["absentExcused"] == 1
 
     admin_all_classes_daily = _request(
         "GET",
@@ -256,6 +349,42 @@ def test_full_api_smoke(server_process):
     )
     assert export_daily_csv.headers["Content-Type"].startswith("text/csv")
     assert "Date,Class ID,Class Name,Full Name,Reason" in export_daily_csv.content.decode("utf-8-sig")
+    export_range_csv = _request(
+        "GET",
+        f"/statistics/export?from={today}&to={today}&classId={class_id}&format=csv",
+        200,
+        headers=admin_headers,
+    )
+    assert export_range_csv.headers["Content-Type"].startswith("text/csv")
+    assert f"{today}..{today},{class_id}," in export_range_csv.content.decode("utf-8-sig")
+    _request(
+        "GET",
+        f"/statistics/export?from={today}&to=2000-01-01",
+        400,
+        headers=admin_headers,
+    )
+    batch = _request(
+        "PUT",
+        "/attendance/batch",
+        200,
+        headers=teacher_headers,
+        json={
+            "items": [
+                {"date": today, "totalStudents": 26, "presentCount": 25, "absentUnexcused": ["Orlov"]},
+                {"date": today, "totalStudents": 26, "presentCount": 26},
+                {"date": "2000-01-03", "totalStudents": 26, "presentCount": 27},
+            ]
+        },
+    ).json()
+    assert batch["saved"] == 1
+    assert [item["status"] for item in batch["results"]] == [200, 400, 400]
+    assert all(item["classId"] == class_id for item in batch["results"])
+    batch_attendance = _request(
+        "GET", f"/attendance?date={today}&classId={class_id}", 200, headers=teacher_headers
+    ).json()
+    assert batch_attendance["totalStudents"] == 26
+    assert batch_attendance["absentUnexcused"] == [{"fullName": "Orlov"}]
+    assert batch_attendance["absentExcused"] == []
 
     _request(
         "PATCH",
@@ -295,3 +424,243 @@ def test_full_api_smoke(server_process):
         headers=promoted_admin_headers,
         json={"role": "teacher"},
     )
+
+
+def test_metrics_endpoint(server_process):
+    requests.get(f"{BASE_URL}/api/ping", timeout=5)
+    response = requests.get(f"{BASE_URL}/metrics", timeout=5)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    body = response.text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{method="GET",route="/api/ping",status="200"}' in body
+    assert "db_pool_connections" in body
+
+    # A file response reaches the client before the middleware records it.
+    requests.get(f"{BASE_URL}/frontend/app.js", timeout=5)
+    deadline = time.time() + 5
+    while 'http_requests_total{method="GET",route="/frontend",status="200"}' not in body:
+        assert time.time() < deadline, "static file request was not labelled with its mount path"
+        time.sleep(0.05)
+        body = requests.get(f"{BASE_URL}/metrics", timeout=5).text
+
+
+def test_static_assets_compressed(server_process):
+    response = requests.get(f"{BASE_URL}/frontend/app.js", headers={"Accept-Encoding": "gzip"}, timeout=5)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "initSession();" in response.text
+
+    response = requests.get(f"{BASE_URL}/frontend/app.js", headers={"Accept-Encoding": "identity"}, timeout=5)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+
+def test_attendance_events_stream(admin_headers, class_account):
+    class_id, _, _ = class_account
+    today = date.today().isoformat()
+    with requests.get(f"{API_URL}/events/attendance", headers=admin_headers, stream=True, timeout=10) as stream:
+        assert stream.status_code == 200
+        assert stream.headers["Content-Type"].startswith("text/event-stream")
+        lines = stream.iter_lines(decode_unicode=True)
+        assert next(lines).startswith("retry:")
+        _request(
+            "PUT",
+            f"/attendance?date={today}",
+            200,
+            headers=admin_headers,
+            json={"classId": class_id, "totalStudents": 20, "presentCount": 20},
+        )
+        for line in lines:
+            if line.startswith("data:") and f'"date": "{today}"' in line and str(class_id) in line:
+                break
+        else:
+            pytest.fail("stream ended without a fill event")
+
+
+def test_users_and_classes_pagination(server_process):
+    admin_token = _request(
+        "POST", "/auth/login", 200, json={"login": "admin", "password": "admin123"}
+    ).json()["accessToken"]
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    prefix = f"Page_{int(time.time())}_"
+    for i in range(3):
+        _request("POST", "/classes", 201, headers=admin_headers, json={"name": f"{prefix}{i}", "password": "pass1234"})
+    class_ids = []
+    try:
+        first = _request("GET", f"/classes?namePrefix={prefix.lower()}&limit=2", 200, headers=admin_headers).json()
+        assert first["total"] == 3
+        assert [item["name"] for item in first["items"]] == [f"{prefix}0", f"{prefix}1"]
+        assert first["items"][0]["teacherLogin"] == f"{prefix}0"
+        second = _request(
+            "GET", f"/classes?namePrefix={prefix}&limit=2&after={first['nextCursor']}", 200, headers=admin_headers
+        ).json()
+        assert [item["name"] for item in second["items"]] == [f"{prefix}2"]
+        assert second["nextCursor"] is None
+        class_ids = [item["id"] for item in first["items"] + second["items"]]
+
+        unpaginated = _request("GET", f"/classes?namePrefix={prefix}", 200, headers=admin_headers).json()
+        assert [item["id"] for item in unpaginated] == class_ids
+
+        users = _request(
+            "GET", f"/users?role=teacher&loginPrefix={prefix}&limit=2", 200, headers=admin_headers
+        ).json()
+        assert users["total"] == 3
+        assert [item["classId"] for item in users["items"]] == class_ids[:2]
+        users = _request(
+            "GET",
+            f"/users?role=teacher&loginPrefix={prefix}&limit=2&after={users['nextCursor']}",
+            200,
+            headers=admin_headers,
+        ).json()
+        assert [item["classId"] for item in users["items"]] == class_ids[2:]
+        assert users["nextCursor"] is None
+        assert _request("GET", f"/users?role=admin&loginPrefix={prefix}&limit=2", 200, headers=admin_headers).json() == {
+            "items": [],
+            "total": 0,
+            "nextCursor": None,
+        }
+        assert _request("GET", "/users?loginPrefix=%25&limit=5", 200, headers=admin_headers).json()["total"] == 0
+        _request("GET", "/users?limit=0", 400, headers=admin_headers)
+    finally:
+        for class_id in class_ids:
+            _request("DELETE", f"/classes/{class_id}", 200, headers=admin_headers)
+
+
+def test_query_budgets(query_budget, admin_headers, class_account):
+    class_id, class_name, _ = class_account
+    ts = int(time.time())
+    today = date.today().isoformat()
+    try:
+        for size in (1, 25):
+            query_budget(
+                "PUT",
+                f"/attendance?date={today}",
+                "PUT /attendance",
+                size,
+                headers=admin_headers,
+                json={
+                    "classId": class_id,
+                    "totalStudents": 60,
+                    "presentCount": 60 - 2 * size,
+                    "absentUnexcused": [f"Unexcused {i}" for i in range(size)],
+                    "absentExcused": [{"fullName": f"Excused {i}", "reason": "Болезнь"} for i in range(size)],
+                },
+            )
+
+        query_budget(
+            "PATCH",
+            f"/classes/{class_id}/credentials",
+            "PATCH /classes/{id}/credentials",
+            1,
+            headers=admin_headers,
+            json={"login": f"{class_name}_renamed", "password": "pass12345"},
+        )
+
+        for size in (2, 20):
+            rows = "".join(f"Budget_{ts}_{size}_{i},pass{i}\n" for i in range(size))
+            response = query_budget(
+                "POST",
+                "/classes/import",
+                "POST /classes/import",
+                size,
+                headers=admin_headers,
+                files={"file": ("classes.csv", f"name,password\n{rows}".encode(), "text/csv")},
+            )
+            assert response.json()["created"] == size
+    finally:
+        for item in _request("GET", "/classes", 200, headers=admin_headers).json():
+            if item["name"].startswith(f"Budget_{ts}_"):
+                _request("DELETE", f"/classes/{item['id']}", 200, headers=admin_headers)
+    query_budget("DELETE", f"/classes/{class_id}", "DELETE /classes/{id}", 25, headers=admin_headers)
+
+
+def test_attendance_batch_with_many_absences(admin_headers, class_account):
+    # 500 items of 14 absences each: one parameter per value would pass asyncpg's 32767 limit.
+    class_id, _, _ = class_account
+    first_day = date.today() + timedelta(days=1)
+    items = [
+        {
+            "date": (first_day + timedelta(days=offset)).isoformat(),
+            "classId": class_id,
+            "totalStudents": 30,
+            "presentCount": 16,
+            "absentUnexcused": [f"Unexcused {i}" for i in range(7)],
+            "absentExcused": [{"fullName": f"Excused {i}", "reason": "Болезнь"} for i in range(7)],
+        }
+        for offset in range(500)
+    ]
+    batch = _request("PUT", "/attendance/batch", 200, headers=admin_headers, json={"items": items}).json()
+    assert batch["saved"] == 500
+    last_day = items[-1]["date"]
+    attendance = _request("GET", f"/attendance?date={last_day}&classId={class_id}", 200, headers=admin_headers).json()
+    assert len(attendance["absentUnexcused"]) == 7
+    assert attendance["absentExcused"][0] == {"fullName": "Excused 0", "reason": "Болезнь"}
+
+    items[-1]["presentCount"] = 29
+    items[-1]["absentUnexcused"] = []
+    items[-1]["absentExcused"] = [{"fullName": "Excused 0", "reason": "Травма"}]
+    _request("PUT", "/attendance/batch", 200, headers=admin_headers, json={"items": items[-1:]})
+    attendance = _request("GET", f"/attendance?date={last_day}&classId={class_id}", 200, headers=admin_headers).json()
+    assert attendance["absentUnexcused"] == []
+    assert attendance["absentExcused"] == [{"fullName": "Excused 0", "reason": "Травма"}]
+
+
+def test_login_during_class_import(admin_headers):
+    # A bulk import must not queue logins behind all of its hashing: they are served or shed.
+    prefix = f"Import_{int(time.time())}_"
+    rows = "".join(f"{prefix}{i},pass{i}\n" for i in range(48))
+    import_result = {}
+
+    def run_import() -> None:
+        started = time.perf_counter()
+        import_result["response"] = requests.post(
+            f"{API_URL}/classes/import",
+            headers=admin_headers,
+            files={"file": ("classes.csv", f"name,password\n{rows}".encode(), "text/csv")},
+            timeout=300,
+        )
+        import_result["elapsed"] = time.perf_counter() - started
+
+    importer = threading.Thread(target=run_import)
+    importer.start()
+    try:
+        deadline = time.time() + 10
+        while importer.is_alive() and time.time() < deadline:
+            metrics = requests.get(f"{BASE_URL}/metrics", timeout=5).text
+            if any(line.startswith("bcrypt_pending ") and float(line.split()[1]) > 0 for line in metrics.splitlines()):
+                break
+            time.sleep(0.05)
+        started = time.perf_counter()
+        login = requests.post(
+            f"{API_URL}/auth/login", json={"login": "admin", "password": "admin123"}, timeout=300
+        )
+        login_elapsed = time.perf_counter() - started
+        importer.join()
+        assert login.status_code in (200, 503), login.text
+        assert import_result["response"].status_code == 200, import_result["response"].text
+        assert import_result["response"].json()["created"] == 48
+        assert login_elapsed < max(5, import_result["elapsed"] / 2), (
+            f"login took {login_elapsed:.1f}s during an import of {import_result['elapsed']:.1f}s"
+        )
+    finally:
+        importer.join()
+        for item in _request("GET", f"/classes?namePrefix={prefix}", 200, headers=admin_headers).json():
+            _request("DELETE", f"/classes/{item['id']}", 200, headers=admin_headers)
+
+
+def test_attendance_outside_partition_window(admin_headers, class_account):
+    # Days without a daily partition of their own are stored in the default partition.
+    class_id, _, _ = class_account
+    far_day = (date.today() + timedelta(days=400)).isoformat()
+    _request(
+        "PUT",
+        f"/attendance?date={far_day}",
+        200,
+        headers=admin_headers,
+        json={"classId": class_id, "totalStudents": 20, "presentCount": 19, "absentUnexcused": ["Ivanov"]},
+    )
+    attendance = _request("GET", f"/attendance?date={far_day}&classId={class_id}", 200, headers=admin_headers).json()
+    assert attendance["isFilled"] is True
+    assert attendance["presentCount"] == 19
@@ -70,12 +70,21 @@ def test_openapi_yaml_contains_new_attendance_contract():
     assert "ErrorResponse" in spec
     assert "required: [message]" in spec
     assert "/attendance/unfilled-classes:" in spec
+    assert "/attendance/batch:" in spec
+    assert "/classes/import:" in spec
+    assert "/events/attendance:" in spec
+    assert "UserPage" in spec
+    assert "ClassPage" in spec
+    assert "AttendanceBatchResponse" in spec
     assert "UnfilledClassResponse" in spec
     assert "/classes/{id}/credentials:" in spec
     assert "/classes/{id}:" in spec
     assert "UpdateClassCredentialsRequest" in spec
     assert "/statistics/daily/export:" in spec
     assert "/statistics/daily/export/csv:" in spec
+    assert "/statistics/export:" in spec
+    assert "/statistics/weekly:" in spec
+    assert "WeeklyStatisticsResponse" in spec
     assert "required: [name, password]" in spec
     assert "required: [totalStudents, presentCount]" in spec
 